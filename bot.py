@@ -7,25 +7,32 @@ Saves to Excel (local) + Google Sheets, sends notifications to Owner & HR.
 Uses python-telegram-bot v21 API (ApplicationBuilder).
 """
 
+import re
+import asyncio
 import logging
-from datetime import datetime, timedelta
+import functools
+import importlib.util
+from collections import OrderedDict
+from datetime import datetime, timedelta, time
 
-import pytz
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
-    ApplicationBuilder, CommandHandler, MessageHandler,
+    AIORateLimiter, ApplicationBuilder, CommandHandler, MessageHandler,
     CallbackQueryHandler, ContextTypes, filters,
 )
 
 import config
-from excel_handler import save_to_excel, save_to_google_sheets, update_row_in_google_sheets, load_attendance_from_google_sheets
+from excel_handler import (
+    save_to_csv_async, build_excel_export_async, save_to_google_sheets, update_row_in_google_sheets, load_attendance_from_google_sheets,
+    start_sheets_flusher, stop_sheets_flusher,
+)
 from commands_employee import mystatus_command, myprofile_command, edit_command, leave_command
 from commands_admin import (
     absent_command, late_command, history_command, weeklyreport_command,
     monthly_command, export_command, broadcast_command, deadline_command, sethr_command,
     announce_command, dm_command, remind_command, warning_command,
 )
-from callbacks import allow_callback, edit_callback, leave_callback
+from callbacks import callback_router
 
 # ─── Logging ─────────────────────────────────────────────────────────────────
 logging.basicConfig(
@@ -34,31 +41,99 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Bot API connection pool: one confirmation plus Owner/HR notifications per
+# update, several updates at once. HTTP/2 needs the optional h2 package.
+BOT_API_POOL_SIZE = 32
+BOT_API_HTTP_VERSION = "2" if importlib.util.find_spec("h2") else "1.1"
+
+# Updates handled in parallel. Check-then-record on bot_data (daily_log,
+# allow_usage, pending_*) must stay free of awaits in between.
+CONCURRENT_UPDATES = 32
+
+# Daily refresh of the styled .xlsx built from the CSV store
+NIGHTLY_EXPORT_TIME = time(0, 5, tzinfo=config.TZ)
+
+# Work update format: "EMP_ID Work description" (description may span lines).
+# Only the ID prefix is matched; the description is the rest of the text.
+EMP_ID_PATTERN = re.compile(r"[A-Za-z0-9]+")
+UPDATE_PATTERN = re.compile(rf"\s*({EMP_ID_PATTERN.pattern})\s+")
+
+# /addstaff "ID - Name - Department": the name may contain dashes, the department may not
+ADDSTAFF_PATTERN = re.compile(rf"\s*({EMP_ID_PATTERN.pattern})\s*-\s*(.+?)\s*-\s*([^-]+?)\s*")
+
+
+# Recently handled (chat_id, message_id) pairs, oldest first
+_RECENT_UPDATES = OrderedDict()
+RECENT_UPDATES_MAX = 1024
+
+
+def _is_redelivered(message):
+    """True if this exact message was already handled (Telegram redelivery after a restart or timeout).
+
+    A re-post of the same text is a new message, so it still gets the "Already Submitted" reply.
+    """
+    key = (message.chat.id, message.message_id)
+    if key in _RECENT_UPDATES:
+        return True
+    _RECENT_UPDATES[key] = None
+    if len(_RECENT_UPDATES) > RECENT_UPDATES_MAX:
+        _RECENT_UPDATES.popitem(last=False)
+    return False
+
+
+@functools.lru_cache(maxsize=1)
+def _date_strings(day):
+    """Return (DD-MM-YYYY, weekday, YYYY-MM-DD) for a date; consecutive updates share one."""
+    return f"{day.day:02d}-{day.month:02d}-{day.year}", day.strftime("%A"), day.isoformat()
+
+
+async def _persist_update(data: dict, is_resubmission: bool):
+    """Save an update to the CSV store and Google Sheets concurrently.
+
+    Returns (csv_saved, sheets_saved).
+    """
+    if is_resubmission:
+        # UPDATE existing row instead of creating a new one
+        sheets_save = update_row_in_google_sheets(data)
+    else:
+        sheets_save = save_to_google_sheets(data)
+    return await asyncio.gather(save_to_csv_async(data), sheets_save)
+
 
 # ─── Notification Functions ──────────────────────────────────────────────────
-async def send_personal_notification(bot, chat_id: str, data: dict, label: str):
+def _build_notification_text(data: dict) -> str:
+    """Render the Owner/HR notification for a work update."""
+    esc = config.escape_md
+    return (
+        f"📬 *New Work Update Received*\n"
+        f"━━━━━━━━━━━━━━━━━━━━━━\n"
+        f"👤 *Employee:* {esc(data['emp_name'])} (`{data['emp_id']}`)\n"
+        f"🏢 *Department:* {esc(data['department'])}\n"
+        f"💬 *Telegram:* @{esc(data['username'])}\n"
+        f"📅 *Date:* {data['date']} ({data['day']})\n"
+        f"🕐 *Time:* {data['time']}\n"
+        f"📝 *Update:*\n{esc(data['work_update'])}\n"
+        f"━━━━━━━━━━━━━━━━━━━━━━\n"
+        f"📍 *Group:* {esc(data['group_name'])}"
+    )
+
+
+async def send_personal_notification(bot, chat_id: int, text: str, label: str):
     """Send a personal notification to Owner or HR."""
-    if not chat_id:
-        return
     try:
-        message = (
-            f"📬 *New Work Update Received*\n"
-            f"━━━━━━━━━━━━━━━━━━━━━━\n"
-            f"👤 *Employee:* {data['emp_name']} (`{data['emp_id']}`)\n"
-            f"🏢 *Department:* {data['department']}\n"
-            f"💬 *Telegram:* @{data['username']}\n"
-            f"📅 *Date:* {data['date']} ({data['day']})\n"
-            f"🕐 *Time:* {data['time']}\n"
-            f"📝 *Update:*\n{data['work_update']}\n"
-            f"━━━━━━━━━━━━━━━━━━━━━━\n"
-            f"📍 *Group:* {data['group_name']}"
-        )
-        await bot.send_message(chat_id=int(chat_id), text=message, parse_mode="Markdown")
-        logger.info(f"Notification sent to {label}")
+        await bot.send_message(chat_id=chat_id, text=text, parse_mode="Markdown")
+        logger.debug(f"Notification sent to {label}")
     except Exception as e:
         logger.warning(f"Failed to notify {label}: {e}")
 
 
+async def _notify_admins(bot, text: str):
+    """Send one rendered notification to every Owner/HR chat concurrently."""
+    await asyncio.gather(
+        *(send_personal_notification(bot, chat_id, text, label) for chat_id, label in config.NOTIFY_TARGETS)
+    )
+
+
 # Logic moved to config.py
 
 
@@ -84,111 +159,123 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(msg, parse_mode="Markdown")
 
 
+_HELP_EVERYONE = (
+    "📖 *Bot Commands*\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    "📝 *Submit Update:* `YOUR_ID Work description`\n\n"
+    "🔧 *Everyone:*\n"
+    "• /start — Welcome message\n"
+    "• /help — This menu\n"
+    "• /allow `ID` — Request re-submission\n"
+    "• /mystatus `ID` — Your weekly status (DM)\n"
+    "• /myprofile `ID` — Your profile info (DM)\n"
+    "• /edit `ID New text` — Request edit (needs approval)\n"
+    "• /leave `ID DD-MM-YYYY Reason` — Request leave\n"
+)
+_HELP_ADMIN = (
+    "\n👑 *Admin:*\n"
+    "• /staff — List all employees\n"
+    "• /addstaff `ID - Name - Dept`\n"
+    "• /removestaff `ID`\n"
+    "• /report — Today's full status\n"
+    "• /absent — Quick absent list\n"
+    "• /late — Late submissions\n"
+    "• /history `ID` — Employee 7-day history (DM)\n"
+    "• /weeklyreport — Weekly grid (DM)\n"
+    "• /monthly — Monthly attendance (DM)\n"
+    "• /export — Get Excel file / Sheet link (DM)\n"
+    "• /broadcast `Text` — Send announcement\n"
+    "• /deadline `HH:MM` — Set submission deadline\n"
+)
+_HELP_OWNER = "• /sethr `CHAT_ID` — Change HR\n"
+_HELP_PRIVATE = (
+    "\n🔐 *Private Chat (DM the bot):*\n"
+    "• /announce `Text` — Send announcement to group\n"
+    "• /dm `ID Message` — Message an employee privately\n"
+    "• /remind — Remind all who haven't submitted\n"
+    "• /warning `ID Reason` — Send official warning\n"
+)
+
+# Full help text per role, built once
+_HELP_TEXT = {
+    "employee": _HELP_EVERYONE,
+    "admin": _HELP_EVERYONE + _HELP_ADMIN + _HELP_PRIVATE,
+    "owner": _HELP_EVERYONE + _HELP_ADMIN + _HELP_OWNER + _HELP_PRIVATE,
+}
+
+
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Display all commands based on role."""
     user_id = str(update.effective_user.id)
-    is_admin = config.is_admin(user_id)
+    if config.is_owner(user_id):
+        msg = _HELP_TEXT["owner"]
+    elif config.is_admin(user_id):
+        msg = _HELP_TEXT["admin"]
+    else:
+        msg = _HELP_TEXT["employee"]
 
-    msg = (
-        "📖 *Bot Commands*\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        "📝 *Submit Update:* `YOUR_ID Work description`\n\n"
-        "🔧 *Everyone:*\n"
-        "• /start — Welcome message\n"
-        "• /help — This menu\n"
-        "• /allow `ID` — Request re-submission\n"
-        "• /mystatus `ID` — Your weekly status (DM)\n"
-        "• /myprofile `ID` — Your profile info (DM)\n"
-        "• /edit `ID New text` — Request edit (needs approval)\n"
-        "• /leave `ID DD-MM-YYYY Reason` — Request leave\n"
-    )
+    await update.message.reply_text(msg, parse_mode="Markdown")
 
-    if is_admin:
-        msg += (
-            "\n👑 *Admin:*\n"
-            "• /staff — List all employees\n"
-            "• /addstaff `ID - Name - Dept`\n"
-            "• /removestaff `ID`\n"
-            "• /report — Today's full status\n"
-            "• /absent — Quick absent list\n"
-            "• /late — Late submissions\n"
-            "• /history `ID` — Employee 7-day history (DM)\n"
-            "• /weeklyreport — Weekly grid (DM)\n"
-            "• /monthly — Monthly attendance (DM)\n"
-            "• /export — Get Excel file / Sheet link (DM)\n"
-            "• /broadcast `Text` — Send announcement\n"
-            "• /deadline `HH:MM` — Set submission deadline\n"
-        )
-        if config.is_owner(user_id):
-            msg += "• /sethr `CHAT_ID` — Change HR\n"
-
-        msg += (
-            "\n🔐 *Private Chat (DM the bot):*\n"
-            "• /announce `Text` — Send announcement to group\n"
-            "• /dm `ID Message` — Message an employee privately\n"
-            "• /remind — Remind all who haven't submitted\n"
-            "• /warning `ID Reason` — Send official warning\n"
-        )
 
-    await update.message.reply_text(msg, parse_mode="Markdown")
+# Rendered /staff message, rebuilt after /addstaff or /removestaff
+_staff_list_text = None
 
 
+@config.admin_only
 async def staff_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Display registered staff list (Owner/HR only)."""
-    user_id = str(update.effective_user.id)
-    if not config.is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
-
     if not config.STAFF_RECORDS:
         await update.message.reply_text("📋 No staff records configured.")
         return
 
-    msg = "👥 *Registered Staff*\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
-    for emp_id, info in config.STAFF_RECORDS.items():
-        msg += f"• `{emp_id}` — {info['name']} ({info['dept']})\n"
-    msg += f"\n📊 Total: {len(config.STAFF_RECORDS)} employees"
+    global _staff_list_text
+    if _staff_list_text is None:
+        lines = [f"• `{emp_id}` — {config.escape_md(info['name'])} ({config.escape_md(info['dept'])})" for emp_id, info in config.STAFF_RECORDS.items()]
+        _staff_list_text = "\n".join([
+            "👥 *Registered Staff*\n━━━━━━━━━━━━━━━━━━━━━━\n",
+            *lines,
+            f"\n📊 Total: {len(config.STAFF_RECORDS)} employees",
+        ])
+
+    await update.message.reply_text(_staff_list_text, parse_mode="Markdown")
 
-    await update.message.reply_text(msg, parse_mode="Markdown")
 
+def _invalidate_staff_list():
+    """Drop the cached /staff message after the staff list changes."""
+    global _staff_list_text
+    _staff_list_text = None
 
+
+@config.admin_only
 async def addstaff_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Add a new staff member (Owner/HR only)."""
-    user_id = str(update.effective_user.id)
-    if not config.is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
-
     args = " ".join(context.args)
     if not args:
         await update.message.reply_text("❗ *Usage:* `/addstaff ID - Name - Department`", parse_mode="Markdown")
         return
 
-    try:
-        parts = [p.strip() for p in args.split("-")]
-        if len(parts) != 3:
-            raise ValueError
-        emp_id, name, dept = parts
+    match = ADDSTAFF_PATTERN.fullmatch(args)
+    if not match:
+        await update.message.reply_text(
+            "❗ Use `/addstaff ID - Name - Department`\nID: letters and digits only, e.g. `DEV05`",
+            parse_mode="Markdown",
+        )
+        return
+    emp_id, name, dept = match.groups()
 
-        if config.save_staff_record(emp_id, name, dept):
-            config.STAFF_RECORDS = config.load_staff_records()
-            await update.message.reply_text(
-                f"✅ *Staff Added!*\n🆔 `{emp_id.upper()}` | 👤 {name} | 🏢 {dept.upper()}",
-                parse_mode="Markdown",
-            )
-            logger.info(f"Added staff: {emp_id}")
-        else:
-            await update.message.reply_text("❌ Failed to save.", parse_mode="Markdown")
-    except Exception:
-        await update.message.reply_text("❗ Use `/addstaff ID - Name - Department`", parse_mode="Markdown")
+    if config.save_staff_record(emp_id, name, dept):
+        _invalidate_staff_list()
+        await update.message.reply_text(
+            f"✅ *Staff Added!*\n🆔 `{emp_id.upper()}` | 👤 {config.escape_md(name)} | 🏢 {config.escape_md(dept.upper())}",
+            parse_mode="Markdown",
+        )
+        logger.info(f"Added staff: {emp_id}")
+    else:
+        await update.message.reply_text("❌ Failed to save.", parse_mode="Markdown")
 
 
+@config.admin_only
 async def removestaff_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Remove a staff member (Owner/HR only)."""
-    user_id = str(update.effective_user.id)
-    if not config.is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
-
     if not context.args:
         await update.message.reply_text("❗ *Usage:* `/removestaff EMP_ID`", parse_mode="Markdown")
         return
@@ -200,55 +287,49 @@ async def removestaff_command(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     name = config.STAFF_RECORDS[emp_id]["name"]
     if config.remove_staff_record(emp_id):
-        config.STAFF_RECORDS = config.load_staff_records()
-        await update.message.reply_text(f"✅ *Removed:* `{emp_id}` ({name})", parse_mode="Markdown")
+        _invalidate_staff_list()
+        await update.message.reply_text(f"✅ *Removed:* `{emp_id}` ({config.escape_md(name)})", parse_mode="Markdown")
         logger.info(f"Removed staff: {emp_id}")
     else:
         await update.message.reply_text("❌ Failed to remove.", parse_mode="Markdown")
 
 
+@config.admin_only
 async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Today's full submission status (Owner/HR only)."""
-    user_id = str(update.effective_user.id)
-    if user_id not in [str(config.OWNER_CHAT_ID), str(config.HR_CHAT_ID)]:
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
-
-    tz = pytz.timezone(config.TIMEZONE)
-    now = datetime.now(tz)
-    today_str = now.strftime("%Y-%m-%d")
+    now = datetime.now(config.TZ)
+    today_str = now.date().isoformat()
 
-    if "daily_log" not in context.bot_data:
-        context.bot_data["daily_log"] = config.load_daily_log()
-
-    today_log = context.bot_data.get("daily_log", {}).get(today_str, {})
-    leave_log = config.load_leave_log()
+    today_log = config.get_daily_log(context).get(today_str, {})
+    leave_log = config.get_leave_log(context)
     today_leaves = leave_log.get(today_str, {})
 
     submitted, not_submitted, on_leave = [], [], []
 
     for emp_id, info in config.STAFF_RECORDS.items():
+        label = f"`{emp_id}` — {config.escape_md(info['name'])}"
         if emp_id in today_log:
-            submitted.append(f"✅ `{emp_id}` — {info['name']}")
+            submitted.append(f"✅ {label}")
         elif emp_id in today_leaves:
-            on_leave.append(f"🏖️ `{emp_id}` — {info['name']}")
+            on_leave.append(f"🏖️ {label}")
         else:
-            not_submitted.append(f"❌ `{emp_id}` — {info['name']}")
+            not_submitted.append(f"❌ {label}")
 
     total = len(config.STAFF_RECORDS)
     done = len(submitted)
 
-    msg = f"📊 *Daily Report — {now.strftime('%d %b %Y')}*\n━━━━━━━━━━━━━━━━━━━━━━\n"
-    msg += f"📈 *Progress:* {done}/{total} submitted\n\n"
-
+    parts = [
+        f"📊 *Daily Report — {now.strftime('%d %b %Y')}*\n━━━━━━━━━━━━━━━━━━━━━━\n",
+        f"📈 *Progress:* {done}/{total} submitted\n\n",
+    ]
     if submitted:
-        msg += "*✅ Submitted:*\n" + "\n".join(submitted) + "\n\n"
+        parts += ["*✅ Submitted:*\n", "\n".join(submitted), "\n\n"]
     if on_leave:
-        msg += "*🏖️ On Leave:*\n" + "\n".join(on_leave) + "\n\n"
+        parts += ["*🏖️ On Leave:*\n", "\n".join(on_leave), "\n\n"]
     if not_submitted:
-        msg += "*❌ Not Submitted:*\n" + "\n".join(not_submitted)
+        parts += ["*❌ Not Submitted:*\n", "\n".join(not_submitted)]
 
-    await update.message.reply_text(msg, parse_mode="Markdown")
+    await update.message.reply_text("".join(parts), parse_mode="Markdown")
 
 
 async def allow_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -275,12 +356,9 @@ async def allow_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         record_date, now, _ = config.get_attendance_date()
-        today_str = record_date.strftime("%Y-%m-%d")
+        today_str = record_date.date().isoformat()
 
-        if "daily_log" not in context.bot_data:
-            context.bot_data["daily_log"] = config.load_daily_log()
-
-        today_log = context.bot_data.get("daily_log", {}).get(today_str, {})
+        today_log = config.get_daily_log(context).get(today_str, {})
         if emp_id not in today_log:
             await update.message.reply_text(
                 f"ℹ️ `{emp_id}` has not submitted for {record_date.strftime('%d %b')} — no need to allow.",
@@ -292,34 +370,33 @@ async def allow_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         group_name = update.message.chat.title or "Private Chat"
         chat_id = str(update.message.chat.id)
 
-        # ─── Allow Limit: max 1 per day per employee ─────────────────────────
-        if "allow_usage" not in context.bot_data:
-            context.bot_data["allow_usage"] = {}
-        if today_str not in context.bot_data["allow_usage"]:
-            context.bot_data["allow_usage"][today_str] = {}
+        # Names and titles are user-controlled; escape once for the Markdown messages
+        staff_name_md = config.escape_md(staff_name)
+        requester_name_md = config.escape_md(requester_name)
 
-        usage_count = context.bot_data["allow_usage"][today_str].get(emp_id, 0)
+        # ─── Allow Limit: max 1 per day per employee ─────────────────────────
+        allow_usage = context.bot_data.setdefault("allow_usage", {}).setdefault(today_str, {})
+        usage_count = allow_usage.get(emp_id, 0)
 
         if usage_count >= 1:
             # 2nd+ attempt — send suspicious activity alert to Owner & HR
             alert_msg = (
                 f"🚨 *SUSPICIOUS ACTIVITY ALERT*\n━━━━━━━━━━━━━━━━━━━━━━\n"
-                f"⚠️ *Employee:* {staff_name} (`{emp_id}`)\n"
+                f"⚠️ *Employee:* {staff_name_md} (`{emp_id}`)\n"
                 f"📅 *Date:* {now.strftime('%d %b %Y')}\n"
                 f"🔁 *Allow Attempts:* {usage_count + 1} (exceeded limit!)\n"
-                f"👤 *Requested By:* {requester_name}\n\n"
+                f"👤 *Requested By:* {requester_name_md}\n\n"
                 f"_This employee has already used their 1 allowed re-submission today. "
                 f"Repeated requests may indicate misuse or data manipulation._"
             )
 
-            for admin_id in config.OWNER_CHAT_IDS + ([config.HR_CHAT_ID] if config.HR_CHAT_ID else []):
-                if admin_id:
-                    try:
-                        await context.bot.send_message(
-                            chat_id=int(admin_id), text=alert_msg, parse_mode="Markdown",
-                        )
-                    except Exception as e:
-                        logger.warning(f"Failed to send alert to {admin_id}: {e}")
+            results = await asyncio.gather(*(
+                context.bot.send_message(chat_id=admin_id, text=alert_msg, parse_mode="Markdown")
+                for admin_id in config.ADMIN_CHAT_ID_INTS
+            ), return_exceptions=True)
+            for admin_id, result in zip(config.ADMIN_CHAT_ID_INTS, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Failed to send alert to {admin_id}: {result}")
 
             await update.message.reply_text(
                 f"🚫 *Request Denied*\n\n`{emp_id}` has already used their 1 re-submission for today. "
@@ -330,14 +407,14 @@ async def allow_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         # Track usage (increment AFTER approval is sent)
-        context.bot_data["allow_usage"][today_str][emp_id] = usage_count + 1
+        allow_usage[emp_id] = usage_count + 1
 
         approval_msg = (
             f"🔔 *Re-submission Request*\n━━━━━━━━━━━━━━━━━━━━━━\n"
-            f"👤 *By:* {requester_name}\n"
-            f"🆔 *Employee:* {staff_name} (`{emp_id}`)\n"
+            f"👤 *By:* {requester_name_md}\n"
+            f"🆔 *Employee:* {staff_name_md} (`{emp_id}`)\n"
             f"📅 *Date:* {now.strftime('%d %b %Y')}\n"
-            f"📍 *Group:* {group_name}\n\nApprove re-submission?"
+            f"📍 *Group:* {config.escape_md(group_name)}\n\nApprove re-submission?"
         )
 
         keyboard = InlineKeyboardMarkup([[
@@ -345,15 +422,16 @@ async def allow_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             InlineKeyboardButton("❌ Reject", callback_data=f"allow_reject:{emp_id}:{requester.id}:{chat_id}"),
         ]])
 
-        for admin_id in config.OWNER_CHAT_IDS + ([config.HR_CHAT_ID] if config.HR_CHAT_ID else []):
-            if admin_id:
-                try:
-                    await context.bot.send_message(
-                        chat_id=int(admin_id), text=approval_msg,
-                        parse_mode="Markdown", reply_markup=keyboard,
-                    )
-                except Exception as e:
-                    logger.warning(f"Failed to send to {admin_id}: {e}")
+        results = await asyncio.gather(*(
+            context.bot.send_message(
+                chat_id=admin_id, text=approval_msg,
+                parse_mode="Markdown", reply_markup=keyboard,
+            )
+            for admin_id in config.ADMIN_CHAT_ID_INTS
+        ), return_exceptions=True)
+        for admin_id, result in zip(config.ADMIN_CHAT_ID_INTS, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to send to {admin_id}: {result}")
 
         await update.message.reply_text(f"📨 Request sent to Owner & HR for `{emp_id}`.", parse_mode="Markdown")
         logger.info(f"Allow request for {emp_id} by {requester_name}")
@@ -371,21 +449,27 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not update.message or not update.message.text:
             return
 
-        text = update.message.text.strip()
-
-        # Simple parse: first word = EMP_ID, rest = work
-        parts = text.split(None, 1)
-        if len(parts) < 2:
+        # Single pass: first word = EMP_ID, rest = work
+        text = update.message.text
+        match = UPDATE_PATTERN.match(text)
+        if not match:
             return
 
-        emp_id = parts[0].upper()
-        work_update = parts[1].strip()
-
-        # Only process registered IDs
+        # Only process registered IDs (the common reject for group chatter)
+        emp_id = match.group(1).upper()
         staff_info = config.STAFF_RECORDS.get(emp_id)
         if not staff_info:
             return
 
+        work_update = text[match.end():].rstrip()
+        if not work_update:
+            return
+
+        # Before any side effects (group ID, telegram_id write, logs)
+        if _is_redelivered(update.message):
+            logger.info(f"Ignoring redelivered update from {emp_id}")
+            return
+
         emp_name = staff_info["name"]
         department = staff_info["dept"]
 
@@ -399,48 +483,37 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             config.STAFF_RECORDS[emp_id]["telegram_id"] = str(user.id)
             config.save_staff_records(config.STAFF_RECORDS)
 
-        user = update.message.from_user
         username = user.username if user.username else user.first_name or "Unknown"
         group_name = update.message.chat.title or ("Private Chat" if update.message.chat.type == "private" else "")
 
         record_date, now, is_new_day = config.get_attendance_date()
-        
+
         # ─── Late Check ──────────────────────────────────────────────────────────
         # Check deadline from config (e.g. "11:00")
-        deadline = config.get_deadline()
-        is_late = False
-        try:
-            dh, dm = map(int, deadline.split(":"))
-            if now.hour > dh or (now.hour == dh and now.minute > dm):
-                is_late = True
-        except Exception:
-            pass
+        deadline = config.get_deadline_hm()
+        is_late = deadline is not None and (now.hour, now.minute) > deadline
 
         grace_note = ""
         if not is_new_day:
             grace_note = f"📅 _Recorded for {record_date.strftime('%d %b %Y')} (On Time)_"
 
+        date_str, day_str, log_date_str = _date_strings(record_date.date())
+        time_str = now.strftime("%I:%M %p")
         data = {
             "emp_id": emp_id, "department": department, "emp_name": emp_name,
-            "username": username, "date": record_date.strftime("%d-%m-%Y"),
-            "day": record_date.strftime("%A"), "time": now.strftime("%I:%M %p"),
+            "username": username, "date": date_str,
+            "day": day_str, "time": time_str,
             "work_update": work_update, "group_name": group_name,
             "on_time": "No" if is_late else "Yes",
         }
 
-        logger.info(f"Update: {emp_id} | {department} | {emp_name}")
+        logger.info(f"Update: {emp_id} | {department} | {emp_name} | {work_update[:80]}")
 
         # Check daily log
-        if "daily_log" not in context.bot_data:
-            context.bot_data["daily_log"] = config.load_daily_log()
-
-        log_date_str = record_date.strftime("%Y-%m-%d")
-        if log_date_str not in context.bot_data["daily_log"]:
-            context.bot_data["daily_log"][log_date_str] = {}
-
-        if emp_id in context.bot_data["daily_log"][log_date_str]:
+        daily_log = config.get_daily_log(context)
+        if emp_id in daily_log.get(log_date_str, {}):
             await update.message.reply_text(
-                f"❌ *Already Submitted*\n{emp_name} (`{emp_id}`) already submitted for {record_date.strftime('%d %b')}. Use `/allow {emp_id}` to request re-submission.",
+                f"❌ *Already Submitted*\n{config.escape_md(emp_name)} (`{emp_id}`) already submitted for {record_date.strftime('%d %b')}. Use `/allow {emp_id}` to request re-submission.",
                 parse_mode="Markdown",
             )
             return
@@ -454,49 +527,40 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         data["is_resubmission"] = is_resubmission
 
-        context.bot_data["daily_log"][log_date_str][emp_id] = {
-            "time": now.strftime("%I:%M %p"), "work": work_update, "late": is_late,
+        config.record_daily_entry(daily_log, log_date_str, emp_id, {
+            "time": time_str, "work": work_update, "late": is_late,
             "username": username, "group": group_name, "is_resubmission": is_resubmission
-        }
-
-        # Save to Excel & Google Sheets
-        save_to_excel(data)
-        
-        sheets_success = False
-        if is_resubmission:
-            # UPDATE existing row instead of creating a new one
-            sheets_success = await update_row_in_google_sheets(data)
-        else:
-            sheets_success = await save_to_google_sheets(data)
+        })
 
-        if not sheets_success:
-            logger.warning(f"Google Sheets update failed for {emp_id}")
-            # We don't block the user but we notify in logs
-
-        if config.IS_RAILWAY:
-            logger.warning("Excel on Railway is ephemeral.")
+        # Persist in the background while the confirmation and notifications go out
+        persist_task = asyncio.create_task(_persist_update(data, is_resubmission))
 
         # Confirmation
-        confirm_msg = f"Thank you, *{emp_name}*! ✅"
+        confirm_msg = f"Thank you, *{config.escape_md(emp_name)}*! ✅"
         if is_resubmission:
             confirm_msg += "\n📝 _Your previous entry has been updated._"
-        
-        if not sheets_success and config.GOOGLE_SHEET_ID:
-             confirm_msg += "\n⚠️ _Note: Google Sheets sync failed, but Excel is saved._"
-             
+
         if grace_note:
             confirm_msg += f"\n{grace_note}"
-        await update.message.reply_text(confirm_msg, parse_mode="Markdown")
 
-        # Notifications
-        notification_data = data.copy()
-        if is_resubmission:
-            notification_data["work_update"] = f"[RE-SUBMIT] {work_update}"
-        for owner_id in config.OWNER_CHAT_IDS:
-            await send_personal_notification(context.bot, owner_id, notification_data, "Owner")
-        await send_personal_notification(context.bot, config.HR_CHAT_ID, notification_data, "HR")
+        # Owner/HR notifications go out in the background; the handler only
+        # waits for the confirmation and persistence
+        if config.NOTIFY_TARGETS:
+            notification_data = data.copy()
+            if is_resubmission:
+                notification_data["work_update"] = f"[RE-SUBMIT] {work_update}"
+            context.application.create_task(
+                _notify_admins(context.bot, _build_notification_text(notification_data)),
+                update=update,
+            )
+
+        try:
+            await update.message.reply_text(confirm_msg, parse_mode="Markdown")
+        except Exception as e:
+            logger.warning(f"Failed to confirm update for {emp_id}: {e}")
 
-        config.save_daily_log(context.bot_data["daily_log"])
+        # Sheets rows are only queued here; the writer retries and logs failures
+        await persist_task
 
     except Exception as e:
         logger.error(f"CRITICAL ERROR in handle_message: {e}", exc_info=True)
@@ -506,50 +570,94 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             pass
 
 
+# ─── Scheduled Jobs ──────────────────────────────────────────────────────────
+async def nightly_export_job(context: ContextTypes.DEFAULT_TYPE):
+    """Regenerate the Excel export so the file on disk is at most a day old."""
+    await build_excel_export_async()
+
+
 # ─── Bot Startup ─────────────────────────────────────────────────────────────
 def main():
     """Start the bot."""
-    logger.info("=" * 55)
-    logger.info("  Employee Work Update Bot — Starting")
-    logger.info("=" * 55)
+    logger.info(f"{'=' * 55}\n  Employee Work Update Bot — Starting\n{'=' * 55}")
 
     if not config.BOT_TOKEN:
         logger.error("BOT_TOKEN not set! Add it to .env file.")
         return
 
-    logger.info(f"  Excel: {config.EXCEL_FILE}")
-    logger.info(f"  Google Sheets: {'ON' if config.GOOGLE_SHEET_ID else 'OFF'}")
-    logger.info(f"  Owner: {'ON' if config.OWNER_CHAT_ID else 'OFF'}")
-    logger.info(f"  HR: {'ON' if config.HR_CHAT_ID else 'OFF'}")
-    logger.info(f"  Deadline: {config.get_deadline()}")
-    logger.info(f"  Staff: {len(config.STAFF_RECORDS)} loaded")
-    logger.info("=" * 55)
-
-    app = ApplicationBuilder().token(config.BOT_TOKEN).build()
+    logger.info(
+        f"\n  Excel: {config.EXCEL_FILE}"
+        f"\n  Google Sheets: {'ON' if config.GOOGLE_SHEET_ID else 'OFF'}"
+        f"\n  Owner: {'ON' if config.OWNER_CHAT_ID else 'OFF'}"
+        f"\n  HR: {'ON' if config.HR_CHAT_ID else 'OFF'}"
+        f"\n  Deadline: {config.get_deadline()}"
+        f"\n  Updates: {'Webhook' if config.WEBHOOK_URL else 'Polling'}"
+        f"\n  Staff: {len(config.STAFF_RECORDS)} loaded"
+        f"\n{'=' * 55}"
+    )
+    if config.IS_RAILWAY:
+        logger.warning("Excel on Railway is ephemeral — use Google Sheets for persistent storage.")
+
+    builder = (
+        ApplicationBuilder()
+        .token(config.BOT_TOKEN)
+        .connection_pool_size(BOT_API_POOL_SIZE)
+        .connect_timeout(5)
+        .read_timeout(10)
+        # Bursts of approvals can briefly need more than the pool; queue for a
+        # free connection instead of failing after the 1s default
+        .pool_timeout(20)
+        .http_version(BOT_API_HTTP_VERSION)
+        .concurrent_updates(CONCURRENT_UPDATES)
+    )
+    # Stay under Telegram's flood limits instead of hitting 429 retry_after waits
+    if importlib.util.find_spec("aiolimiter"):
+        builder.rate_limiter(AIORateLimiter(
+            overall_max_rate=28, overall_time_period=1,
+            group_max_rate=18, group_time_period=60,
+            max_retries=1,
+        ))
+    else:
+        logger.warning("aiolimiter not installed — outgoing messages are not rate limited.")
+    app = builder.build()
 
     # Load attendance from Google Sheets on startup (for real-time data)
     async def post_init(application):
-        """Load attendance history from Google Sheets on bot startup."""
+        """Load the daily log from disk and merge attendance history from Google Sheets."""
+        daily_log = application.bot_data["daily_log"] = config.load_daily_log()
+        leave_log = application.bot_data["leave_log"] = config.load_leave_log()
+        application.bot_data.setdefault("allow_usage", {})
+
         logger.info("Loading attendance from Google Sheets...")
         try:
             sheets_log = await load_attendance_from_google_sheets()
             if sheets_log:
-                if "daily_log" not in application.bot_data:
-                    application.bot_data["daily_log"] = {}
-                # Merge: sheets data as base, in-memory overwrites
+                # Merge: sheets data as base, local log overwrites
                 for date_key, entries in sheets_log.items():
-                    if date_key not in application.bot_data["daily_log"]:
-                        application.bot_data["daily_log"][date_key] = {}
+                    day_log = daily_log.setdefault(date_key, {})
                     for emp_id, data in entries.items():
-                        if emp_id not in application.bot_data["daily_log"][date_key]:
-                            application.bot_data["daily_log"][date_key][emp_id] = data
+                        day_log.setdefault(emp_id, data)
                 logger.info(f"Loaded {sum(len(v) for v in sheets_log.values())} entries from Google Sheets")
             else:
                 logger.info("No data from Google Sheets (empty or not available)")
         except Exception as e:
             logger.warning(f"Could not load from Google Sheets: {e}")
 
+        # Fold the journal and merged history into a fresh snapshot, then
+        # start the background writers for the daily log and new Sheets rows
+        await asyncio.to_thread(config.save_daily_log, daily_log)
+        config.start_daily_log_flusher(daily_log)
+        config.start_leave_log_flusher(leave_log)
+        start_sheets_flusher()
+
+    async def post_shutdown(application):
+        """Write out the daily/leave logs and any queued Google Sheets rows before exiting."""
+        await config.stop_daily_log_flusher(application.bot_data["daily_log"])
+        await config.stop_leave_log_flusher(application.bot_data["leave_log"])
+        await stop_sheets_flusher()
+
     app.post_init = post_init
+    app.post_shutdown = post_shutdown
 
     # Basic commands
     app.add_handler(CommandHandler("start", start_command))
@@ -584,14 +692,28 @@ def main():
     app.add_handler(CommandHandler("warning", warning_command))
 
     # Callback handlers for buttons
-    app.add_handler(CallbackQueryHandler(allow_callback, pattern=r"^allow_"))
-    app.add_handler(CallbackQueryHandler(edit_callback, pattern=r"^edit_"))
-    app.add_handler(CallbackQueryHandler(leave_callback, pattern=r"^leave_"))
+    app.add_handler(CallbackQueryHandler(callback_router, pattern=r"^(allow|edit|leave)_(approve|reject):"))
 
     # Message handler (must be last)
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
-    app.run_polling(drop_pending_updates=True)
+    # JobQueue needs the [job-queue] extra; /export still works without it
+    if app.job_queue:
+        app.job_queue.run_daily(nightly_export_job, time=NIGHTLY_EXPORT_TIME, name="nightly_excel_export")
+    else:
+        logger.warning("JobQueue unavailable — Excel file is only generated on /export.")
+
+    if config.WEBHOOK_URL:
+        # Telegram pushes each update to us instead of being polled
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=config.WEBHOOK_PORT,
+            url_path=config.BOT_TOKEN,
+            webhook_url=f"{config.WEBHOOK_URL}/{config.BOT_TOKEN}",
+            drop_pending_updates=True,
+        )
+    else:
+        app.run_polling(drop_pending_updates=True)
 
 
 if __name__ == "__main__":
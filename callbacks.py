@@ -3,131 +3,105 @@ Callback handlers for inline keyboard buttons.
 Handles: allow approve/reject, edit approve/reject, leave approve/reject.
 """
 
+import re
+import asyncio
 import logging
 from datetime import datetime
 
-import pytz
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
 
 import config
-from excel_handler import save_leave_to_excel, save_leave_to_google_sheets, count_monthly_leaves, update_row_in_google_sheets, save_to_excel
+from excel_handler import (
+    save_leave_to_csv_async, save_leave_to_google_sheets, update_row_in_google_sheets, save_to_csv_async,
+)
 
 logger = logging.getLogger(__name__)
 
+# callback_data layouts (see the InlineKeyboardButton builders in bot.py / commands_employee.py)
+ALLOW_DATA_PATTERN = re.compile(r"(?P<action>allow_(?:approve|reject)):(?P<emp>[^:]+):(?P<requester>\d+):(?P<chat>-?\d+)")
+EDIT_DATA_PATTERN = re.compile(r"(?P<action>edit_(?:approve|reject)):(?P<emp>[^:]+):(?P<chat>-?\d+)")
+LEAVE_DATA_PATTERN = re.compile(
+    r"(?P<action>leave_(?:approve|reject)):(?P<emp>[^:]+):(?P<date>\d{1,2}-\d{1,2}-\d{4}):(?P<chat>-?\d+)"
+)
 
-async def allow_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle Approve/Reject for /allow re-submission requests."""
-    query = update.callback_query
-    await query.answer()
 
-    admin_id = str(query.from_user.id)
-    admin_name = query.from_user.first_name or "Admin"
+async def _notify_group(bot, group_chat_id, group_text):
+    try:
+        await bot.send_message(chat_id=group_chat_id, text=group_text, parse_mode="Markdown")
+    except TelegramError as e:
+        logger.warning(f"Failed to notify group: {e}")
 
-    if not config.is_admin(admin_id):
-        await query.edit_message_text("🚫 You are not authorized.")
-        return
 
-    parts = query.data.split(":")
-    if len(parts) != 4:
-        await query.edit_message_text("❌ Invalid request data.")
-        return
+async def _answer_and_notify_group(query, context, admin_text, group_chat_id, group_text):
+    """Update the admin's request message; the group notification goes out in the background."""
+    context.application.create_task(_notify_group(context.bot, group_chat_id, group_text))
+    try:
+        await query.edit_message_text(admin_text, parse_mode="Markdown")
+    except TelegramError as e:
+        logger.warning(f"Failed to update request message: {e}")
 
-    action, emp_id, requester_id, group_chat_id = parts
+
+async def _allow_action(query, context, admin_name, action, emp_id, requester_id, group_chat_id):
+    """Handle Approve/Reject for /allow re-submission requests."""
     staff_name = config.STAFF_RECORDS.get(emp_id, {}).get("name", emp_id)
+    name_md, admin_md = config.escape_md(staff_name), config.escape_md(admin_name)
 
     if action == "allow_approve":
         record_date, now, _ = config.get_attendance_date()
         today_str = record_date.strftime("%Y-%m-%d")
 
-        if "daily_log" not in context.bot_data:
-            context.bot_data["daily_log"] = config.load_daily_log()
+        config.remove_daily_entry(config.get_daily_log(context), today_str, emp_id)
 
-        if today_str in context.bot_data.get("daily_log", {}) and emp_id in context.bot_data["daily_log"][today_str]:
-            del context.bot_data["daily_log"][today_str][emp_id]
-            config.save_daily_log(context.bot_data["daily_log"])
-
-        await query.edit_message_text(
-            f"✅ *Approved* by {admin_name}\n\nEmployee `{emp_id}` ({staff_name}) can now re-submit today.",
-            parse_mode="Markdown",
+        await _answer_and_notify_group(
+            query, context,
+            f"✅ *Approved* by {admin_md}\n\nEmployee `{emp_id}` ({name_md}) can now re-submit today.",
+            group_chat_id,
+            f"✅ *Re-submission Approved!*\n\n`{emp_id}` ({name_md}) — approved by {admin_md}. You can submit again.",
         )
 
-        try:
-            await context.bot.send_message(
-                chat_id=int(group_chat_id),
-                text=f"✅ *Re-submission Approved!*\n\n`{emp_id}` ({staff_name}) — approved by {admin_name}. You can submit again.",
-                parse_mode="Markdown",
-            )
-        except Exception as e:
-            logger.warning(f"Failed to notify group: {e}")
-
         logger.info(f"Re-submission approved for {emp_id} by {admin_name}")
 
     elif action == "allow_reject":
-        await query.edit_message_text(
-            f"❌ *Rejected* by {admin_name}\n\nRe-submission for `{emp_id}` ({staff_name}) was denied.",
-            parse_mode="Markdown",
+        await _answer_and_notify_group(
+            query, context,
+            f"❌ *Rejected* by {admin_md}\n\nRe-submission for `{emp_id}` ({name_md}) was denied.",
+            group_chat_id,
+            f"❌ *Re-submission Denied*\n\n`{emp_id}` ({name_md}) — denied by {admin_md}.",
         )
-        try:
-            await context.bot.send_message(
-                chat_id=int(group_chat_id),
-                text=f"❌ *Re-submission Denied*\n\n`{emp_id}` ({staff_name}) — denied by {admin_name}.",
-                parse_mode="Markdown",
-            )
-        except Exception as e:
-            logger.warning(f"Failed to notify group: {e}")
 
         logger.info(f"Re-submission rejected for {emp_id} by {admin_name}")
 
 
-async def edit_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def _edit_action(query, context, admin_name, action, emp_id, group_chat_id):
     """Handle Approve/Reject for /edit requests."""
-    query = update.callback_query
-    await query.answer()
-
-    admin_id = str(query.from_user.id)
-    admin_name = query.from_user.first_name or "Admin"
-
-    if not config.is_admin(admin_id):
-        await query.edit_message_text("🚫 You are not authorized.")
-        return
-
-    parts = query.data.split(":")
-    if len(parts) != 3:
-        await query.edit_message_text("❌ Invalid request data.")
-        return
-
-    action, emp_id, group_chat_id = parts
-    staff_name = config.STAFF_RECORDS.get(emp_id, {}).get("name", emp_id)
+    staff_info = config.STAFF_RECORDS.get(emp_id) or {}
+    staff_name = staff_info.get("name", emp_id)
+    name_md, admin_md = config.escape_md(staff_name), config.escape_md(admin_name)
+    pending_edits = context.bot_data.setdefault("pending_edits", {})
 
     if action == "edit_approve":
-        # Get pending edit text
-        pending = context.bot_data.get("pending_edits", {}).get(emp_id, {})
-        new_text = pending.get("new_text", "N/A")
-
-        await query.edit_message_text(
-            f"✅ *Edit Approved* by {admin_name}\n\n"
-            f"Employee `{emp_id}` ({staff_name})\n"
-            f"📝 New update: _{new_text}_",
-            parse_mode="Markdown",
+        # Claim the pending edit before any await so a concurrent second
+        # approval (Owner and HR) can't apply it twice
+        pending = pending_edits.pop(emp_id, None)
+        new_text = (pending or {}).get("new_text", "N/A")
+
+        await _answer_and_notify_group(
+            query, context,
+            f"✅ *Edit Approved* by {admin_md}\n\n"
+            f"Employee `{emp_id}` ({name_md})\n"
+            f"📝 New update: {config.escape_md(new_text)}",
+            group_chat_id,
+            f"✅ *Edit Approved!*\n\n`{emp_id}` ({name_md}) — your edit was approved by {admin_md}.",
         )
 
-        try:
-            await context.bot.send_message(
-                chat_id=int(group_chat_id),
-                text=f"✅ *Edit Approved!*\n\n`{emp_id}` ({staff_name}) — your edit was approved by {admin_name}.",
-                parse_mode="Markdown",
-            )
-        except Exception as e:
-            logger.warning(f"Failed to notify group: {e}")
-
-        # Clean up pending
-        if emp_id in context.bot_data.get("pending_edits", {}):
+        if pending is not None:
             # Update Sheets
             data = {
                 "emp_id": emp_id,
                 "emp_name": staff_name,
-                "department": config.STAFF_RECORDS.get(emp_id, {}).get("dept", "N/A"),
+                "department": staff_info.get("dept", "N/A"),
                 "username": "N/A",  # We don't have it here easily
                 "date": pending.get("date", "N/A"),
                 "day": "N/A",
@@ -135,139 +109,130 @@ async def edit_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "work_update": new_text,
                 "group_name": "N/A",
             }
-            save_to_excel(data)
+            await save_to_csv_async(data)
             await update_row_in_google_sheets(data)
-            del context.bot_data["pending_edits"][emp_id]
 
         logger.info(f"Edit approved for {emp_id} by {admin_name}")
 
     elif action == "edit_reject":
-        await query.edit_message_text(
-            f"❌ *Edit Rejected* by {admin_name}\n\nEdit for `{emp_id}` ({staff_name}) was denied.",
-            parse_mode="Markdown",
+        await _answer_and_notify_group(
+            query, context,
+            f"❌ *Edit Rejected* by {admin_md}\n\nEdit for `{emp_id}` ({name_md}) was denied.",
+            group_chat_id,
+            f"❌ *Edit Denied*\n\n`{emp_id}` ({name_md}) — edit denied by {admin_md}.",
         )
-        try:
-            await context.bot.send_message(
-                chat_id=int(group_chat_id),
-                text=f"❌ *Edit Denied*\n\n`{emp_id}` ({staff_name}) — edit denied by {admin_name}.",
-                parse_mode="Markdown",
-            )
-        except Exception as e:
-            logger.warning(f"Failed to notify group: {e}")
 
-        if emp_id in context.bot_data.get("pending_edits", {}):
-            del context.bot_data["pending_edits"][emp_id]
+        pending_edits.pop(emp_id, None)
 
         logger.info(f"Edit rejected for {emp_id} by {admin_name}")
 
 
-async def leave_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def _leave_action(query, context, admin_name, action, emp_id, leave_date, group_chat_id):
     """Handle Approve/Reject for /leave requests."""
-    query = update.callback_query
-    await query.answer()
-
-    admin_id = str(query.from_user.id)
-    admin_name = query.from_user.first_name or "Admin"
-
-    if not config.is_admin(admin_id):
-        await query.edit_message_text("🚫 You are not authorized.")
-        return
-
-    parts = query.data.split(":")
-    if len(parts) != 4:
-        await query.edit_message_text("❌ Invalid request data.")
-        return
-
-    action, emp_id, leave_date, group_chat_id = parts
-    staff_name = config.STAFF_RECORDS.get(emp_id, {}).get("name", emp_id)
-    dept = config.STAFF_RECORDS.get(emp_id, {}).get("dept", "UNKNOWN")
+    staff_info = config.STAFF_RECORDS.get(emp_id) or {}
+    staff_name = staff_info.get("name", emp_id)
+    dept = staff_info.get("dept", "UNKNOWN")
+    name_md, admin_md = config.escape_md(staff_name), config.escape_md(admin_name)
+    pending_leaves = context.bot_data.setdefault("pending_leaves", {})
+    key = f"{emp_id}:{leave_date}"
 
     if action == "leave_approve":
-        # Save to leave log
-        leave_log = config.load_leave_log()
-        # Convert DD-MM-YYYY to YYYY-MM-DD for log key
-        try:
-            date_obj = datetime.strptime(leave_date, "%d-%m-%Y")
-            log_key = date_obj.strftime("%Y-%m-%d")
-            month_key = date_obj.strftime("%Y-%m")
-        except Exception:
-            log_key = leave_date
-            month_key = leave_date[:7]
-
-        if log_key not in leave_log:
-            leave_log[log_key] = {}
-
-        pending = context.bot_data.get("pending_leaves", {}).get(f"{emp_id}:{leave_date}", {})
+        # Convert DD-MM-YYYY to YYYY-MM-DD for log key. /leave zero-pads dates, so slice;
+        # only buttons sent before that carry unpadded dates and need strptime.
+        if len(leave_date) == 10:
+            log_key = f"{leave_date[6:]}-{leave_date[3:5]}-{leave_date[:2]}"
+        else:
+            try:
+                log_key = datetime.strptime(leave_date, "%d-%m-%Y").strftime("%Y-%m-%d")
+            except ValueError:
+                log_key = leave_date
+        month_key = log_key[:7]
+
+        # Claim it up front, same as edit_approve
+        pending = pending_leaves.pop(key, None) or {}
         reason = pending.get("reason", "N/A")
 
-        leave_log[log_key][emp_id] = {"approved_by": admin_name, "reason": reason}
-
-        # Update monthly leave counter
-        if "_monthly_counts" not in leave_log:
-            leave_log["_monthly_counts"] = {}
-        if month_key not in leave_log["_monthly_counts"]:
-            leave_log["_monthly_counts"][month_key] = {}
-        if emp_id not in leave_log["_monthly_counts"][month_key]:
-            leave_log["_monthly_counts"][month_key][emp_id] = 0
-        leave_log["_monthly_counts"][month_key][emp_id] += 1
-        leave_count = leave_log["_monthly_counts"][month_key][emp_id]
-
-        config.save_leave_log(leave_log)
+        # Save to leave log and update the monthly leave counter
+        leave_count = config.record_leave_approval(
+            config.get_leave_log(context), emp_id, log_key, month_key, admin_name, reason
+        )
 
         # Save to Excel Leave Register (with deduction if > 3)
-        save_leave_to_excel(emp_id, staff_name, dept, leave_date, reason, admin_name, leave_count)
+        await save_leave_to_csv_async(emp_id, staff_name, dept, leave_date, reason, admin_name, leave_count)
 
         # Save to Google Sheets Leave Register
         await save_leave_to_google_sheets(emp_id, staff_name, dept, leave_date, reason, admin_name, leave_count)
 
         # Admin message — shows deduction info privately
+        extra = "" if leave_count <= 3 else (
+            f"\n\n⚠️ *Extra leave!* Salary deduction: *-₹{(leave_count - 3) * 500}*"
+            f"\n_(3 free leaves exceeded, ₹500 per extra leave)_"
+        )
         admin_msg = (
-            f"✅ *Leave Approved* by {admin_name}\n\n"
-            f"🆔 `{emp_id}` ({staff_name})\n"
+            f"✅ *Leave Approved* by {admin_md}\n\n"
+            f"🆔 `{emp_id}` ({name_md})\n"
             f"📅 {leave_date}\n"
-            f"📊 Leave #{leave_count} this month"
+            f"📊 Leave #{leave_count} this month{extra}"
         )
-        if leave_count > 3:
-            deduction = (leave_count - 3) * 500
-            admin_msg += f"\n\n⚠️ *Extra leave!* Salary deduction: *-₹{deduction}*"
-            admin_msg += f"\n_(3 free leaves exceeded, ₹500 per extra leave)_"
-
-        await query.edit_message_text(admin_msg, parse_mode="Markdown")
 
         # Group message — simple, NO deduction info shown
-        try:
-            await context.bot.send_message(
-                chat_id=int(group_chat_id),
-                text=f"✅ *Leave Approved!*\n\n`{emp_id}` ({staff_name}) — leave on `{leave_date}` approved by {admin_name}.",
-                parse_mode="Markdown",
-            )
-        except Exception as e:
-            logger.warning(f"Failed to notify group: {e}")
-
-        # Clean up
-        key = f"{emp_id}:{leave_date}"
-        if key in context.bot_data.get("pending_leaves", {}):
-            del context.bot_data["pending_leaves"][key]
+        await _answer_and_notify_group(
+            query, context, admin_msg,
+            group_chat_id,
+            f"✅ *Leave Approved!*\n\n`{emp_id}` ({name_md}) — leave on `{leave_date}` approved by {admin_md}.",
+        )
 
         logger.info(f"Leave #{leave_count} approved for {emp_id} on {leave_date} by {admin_name}")
 
     elif action == "leave_reject":
-        await query.edit_message_text(
-            f"❌ *Leave Rejected* by {admin_name}\n\n"
-            f"Leave for `{emp_id}` ({staff_name}) on `{leave_date}` was denied.",
-            parse_mode="Markdown",
+        await _answer_and_notify_group(
+            query, context,
+            f"❌ *Leave Rejected* by {admin_md}\n\n"
+            f"Leave for `{emp_id}` ({name_md}) on `{leave_date}` was denied.",
+            group_chat_id,
+            f"❌ *Leave Denied*\n\n`{emp_id}` ({name_md}) — leave on `{leave_date}` denied by {admin_md}.",
         )
-        try:
-            await context.bot.send_message(
-                chat_id=int(group_chat_id),
-                text=f"❌ *Leave Denied*\n\n`{emp_id}` ({staff_name}) — leave on `{leave_date}` denied by {admin_name}.",
-                parse_mode="Markdown",
-            )
-        except Exception as e:
-            logger.warning(f"Failed to notify group: {e}")
 
-        key = f"{emp_id}:{leave_date}"
-        if key in context.bot_data.get("pending_leaves", {}):
-            del context.bot_data["pending_leaves"][key]
+        pending_leaves.pop(key, None)
 
         logger.info(f"Leave rejected for {emp_id} on {leave_date} by {admin_name}")
+
+
+# callback_data prefix -> (payload pattern, handler)
+_CALLBACK_ROUTES = {
+    "allow": (ALLOW_DATA_PATTERN, _allow_action),
+    "edit": (EDIT_DATA_PATTERN, _edit_action),
+    "leave": (LEAVE_DATA_PATTERN, _leave_action),
+}
+
+
+async def _dispatch_callback(query, context):
+    admin_id = str(query.from_user.id)
+    admin_name = query.from_user.first_name or "Admin"
+
+    if not config.is_admin(admin_id):
+        await query.edit_message_text("🚫 You are not authorized.")
+        return
+
+    route = _CALLBACK_ROUTES.get(query.data.partition("_")[0])
+    match = route and route[0].fullmatch(query.data)
+    if not match:
+        await query.edit_message_text("❌ Invalid request data.")
+        return
+
+    *fields, group_chat_id = match.groups()
+    await route[1](query, context, admin_name, *fields, int(group_chat_id))
+
+
+async def callback_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Check the admin, parse the button's callback_data and hand off to its action handler."""
+    query = update.callback_query
+    # Answer (stops the button spinner) while the action runs rather than before it
+    answer_task = asyncio.create_task(query.answer())
+    try:
+        await _dispatch_callback(query, context)
+    finally:
+        try:
+            await answer_task
+        except Exception as e:
+            logger.warning(f"Failed to answer callback query: {e}")
@@ -3,40 +3,58 @@ Admin commands for the Work Update Bot (Owner & HR only).
 Commands: /absent, /late, /history, /weeklyreport, /monthly, /export, /broadcast, /deadline, /sethr
 """
 
-import os
+import asyncio
 import logging
 from datetime import datetime, timedelta
 
-import pytz
 from telegram import Update
 from telegram.ext import ContextTypes
 
 import config
+from excel_handler import build_excel_export_async
 
 logger = logging.getLogger(__name__)
 
 
-def _is_admin(user_id: str) -> bool:
-    """Check if the user is Owner or HR."""
-    return config.is_admin(user_id)
+def _parse_clock(time_str):
+    """Parse a stored "%I:%M %p" submission time (e.g. "09:45 AM") into (hour, minute)."""
+    hm, period = time_str.split()
+    hour, minute = hm.split(":")
+    hour = int(hour) % 12 + (12 if period.upper() == "PM" else 0)
+    return hour, int(minute)
 
 
-async def absent_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Quick list of who hasn't submitted today (group reply)."""
-    user_id = str(update.effective_user.id)
-    if not _is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
+async def _send_report_dm(update, context, msg, sent_note):
+    """DM a report to the admin while confirming in the group; fall back to replying with it."""
+    sends = [context.bot.send_message(chat_id=update.effective_user.id, text=msg, parse_mode="Markdown")]
+    if update.message.chat.type != "private":
+        sends.append(update.message.reply_text(sent_note, parse_mode="Markdown"))
+    dm_result, *note_result = await asyncio.gather(*sends, return_exceptions=True)
+    if not isinstance(dm_result, Exception):
         return
 
-    tz = pytz.timezone(config.TIMEZONE)
-    now = datetime.now(tz)
-    today_str = now.strftime("%Y-%m-%d")
+    # DM failed (admin hasn't started the bot): take back the note and show the report where they asked
+    logger.warning(f"Report DM failed: {dm_result}")
+    if note_result and not isinstance(note_result[0], Exception):
+        try:
+            await note_result[0].delete()
+        except Exception as delete_err:
+            logger.warning(f"Failed to remove DM note: {delete_err}")
+    try:
+        await update.message.reply_text(msg, parse_mode="Markdown")
+    except Exception as fallback_err:
+        logger.warning(f"Report fallback failed: {fallback_err}")
+        await update.message.reply_text("❌ Couldn't send the report here or by DM.")
+
 
-    if "daily_log" not in context.bot_data:
-        context.bot_data["daily_log"] = config.load_daily_log()
+@config.admin_only
+async def absent_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Quick list of who hasn't submitted today (group reply)."""
+    now = datetime.now(config.TZ)
+    today_str = now.strftime("%Y-%m-%d")
 
-    today_log = context.bot_data.get("daily_log", {}).get(today_str, {})
-    leave_log = config.load_leave_log()
+    today_log = config.get_daily_log(context).get(today_str, {})
+    leave_log = config.get_leave_log(context)
     today_leaves = leave_log.get(today_str, {})
 
     absent = []
@@ -55,27 +73,16 @@ async def absent_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"Absent list generated: {len(absent)} missing")
 
 
+@config.admin_only
 async def late_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show employees who submitted after the deadline (group reply)."""
-    user_id = str(update.effective_user.id)
-    if not _is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
-
-    tz = pytz.timezone(config.TIMEZONE)
-    now = datetime.now(tz)
+    now = datetime.now(config.TZ)
     today_str = now.strftime("%Y-%m-%d")
     deadline = config.get_deadline()
 
-    if "daily_log" not in context.bot_data:
-        context.bot_data["daily_log"] = config.load_daily_log()
-
-    today_log = context.bot_data.get("daily_log", {}).get(today_str, {})
+    today_log = config.get_daily_log(context).get(today_str, {})
 
-    try:
-        deadline_h, deadline_m = map(int, deadline.split(":"))
-    except Exception:
-        deadline_h, deadline_m = 11, 0
+    deadline_h, deadline_m = config.get_deadline_hm() or (11, 0)
 
     late_list = []
     on_time_list = []
@@ -87,8 +94,7 @@ async def late_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         sub_time = entry.get("time", "") if isinstance(entry, dict) else ""
         if sub_time:
             try:
-                t = datetime.strptime(sub_time, "%I:%M %p")
-                if t.hour > deadline_h or (t.hour == deadline_h and t.minute > deadline_m):
+                if _parse_clock(sub_time) > (deadline_h, deadline_m):
                     late_list.append(f"⏰ `{emp_id}` — {info['name']} (at {sub_time})")
                 else:
                     on_time_list.append(f"✅ `{emp_id}` — {info['name']} (at {sub_time})")
@@ -97,27 +103,24 @@ async def late_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             on_time_list.append(f"✅ `{emp_id}` — {info['name']}")
 
-    msg = f"⏰ *Late Report — {now.strftime('%d %b %Y')}*\n"
-    msg += f"📌 Deadline: {deadline}\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
-
+    parts = [
+        f"⏰ *Late Report — {now.strftime('%d %b %Y')}*\n",
+        f"📌 Deadline: {deadline}\n━━━━━━━━━━━━━━━━━━━━━━\n\n",
+    ]
     if late_list:
-        msg += "*❌ Late Submissions:*\n" + "\n".join(late_list) + "\n\n"
+        parts += ["*❌ Late Submissions:*\n", "\n".join(late_list), "\n\n"]
     if on_time_list:
-        msg += "*✅ On Time:*\n" + "\n".join(on_time_list)
+        parts += ["*✅ On Time:*\n", "\n".join(on_time_list)]
     if not late_list and not on_time_list:
-        msg += "No submissions yet today."
+        parts.append("No submissions yet today.")
 
-    await update.message.reply_text(msg, parse_mode="Markdown")
+    await update.message.reply_text("".join(parts), parse_mode="Markdown")
     logger.info(f"Late report generated: {len(late_list)} late")
 
 
+@config.admin_only
 async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """View last 7 days of an employee's submissions (sent to admin DM)."""
-    user_id = str(update.effective_user.id)
-    if not _is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
-
     if not context.args:
         await update.message.reply_text("❗ *Usage:* `/history EMP_ID`", parse_mode="Markdown")
         return
@@ -128,13 +131,14 @@ async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     staff_info = config.STAFF_RECORDS[emp_id]
-    tz = pytz.timezone(config.TIMEZONE)
-    now = datetime.now(tz)
-    daily_log = config.load_daily_log()
-    leave_log = config.load_leave_log()
+    now = datetime.now(config.TZ)
+    daily_log = config.get_daily_log(context)
+    leave_log = config.get_leave_log(context)
 
-    msg = f"📜 *History — {staff_info['name']} (`{emp_id}`)*\n"
-    msg += f"🏢 {staff_info['dept']}\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    parts = [
+        f"📜 *History — {staff_info['name']} (`{emp_id}`)*\n",
+        f"🏢 {staff_info['dept']}\n━━━━━━━━━━━━━━━━━━━━━━\n\n",
+    ]
 
     for i in range(6, -1, -1):
         day = now - timedelta(days=i)
@@ -148,169 +152,147 @@ async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             entry = day_log[emp_id]
             work = entry.get("work", "Submitted") if isinstance(entry, dict) else "Submitted"
             time_str = entry.get("time", "") if isinstance(entry, dict) else ""
-            msg += f"✅ {day_name} {time_str}\n   _{work[:60]}_\n"
+            parts.append(f"✅ {day_name} {time_str}\n   _{work[:60]}_\n")
         elif emp_id in day_leaves:
-            msg += f"🏖️ {day_name} — On Leave\n"
+            parts.append(f"🏖️ {day_name} — On Leave\n")
         else:
-            msg += f"❌ {day_name} — Absent\n"
+            parts.append(f"❌ {day_name} — Absent\n")
 
-    try:
-        await context.bot.send_message(chat_id=update.effective_user.id, text=msg, parse_mode="Markdown")
-        if update.message.chat.type != "private":
-            await update.message.reply_text("📩 History sent to your DM!", parse_mode="Markdown")
-    except Exception:
-        await update.message.reply_text(msg, parse_mode="Markdown")
+    await _send_report_dm(update, context, "".join(parts), "📩 History sent to your DM!")
 
     logger.info(f"History viewed for {emp_id}")
 
 
+@config.admin_only
 async def weeklyreport_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Weekly summary for all employees (sent to admin DM)."""
-    user_id = str(update.effective_user.id)
-    if not _is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
-
-    tz = pytz.timezone(config.TIMEZONE)
-    now = datetime.now(tz)
-    daily_log = config.load_daily_log()
-    leave_log = config.load_leave_log()
-
-    msg = f"📊 *Weekly Report*\n"
-    msg += f"📅 {(now - timedelta(days=6)).strftime('%d %b')} — {now.strftime('%d %b %Y')}\n"
-    msg += "━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    now = datetime.now(config.TZ)
+    daily_log = config.get_daily_log(context)
+    leave_log = config.get_leave_log(context)
+
+    parts = [
+        "📊 *Weekly Report*\n",
+        f"📅 {(now - timedelta(days=6)).strftime('%d %b')} — {now.strftime('%d %b %Y')}\n",
+        "━━━━━━━━━━━━━━━━━━━━━━\n\n",
+    ]
+
+    # Resolve the week's days once, not once per employee
+    days = [now - timedelta(days=i) for i in range(6, -1, -1)]
+    week_logs = []
+    for day in days:
+        day_str = day.strftime("%Y-%m-%d")
+        week_logs.append((daily_log.get(day_str, {}), leave_log.get(day_str, {})))
 
     # Header row with day abbreviations
-    days_header = "          "
-    for i in range(6, -1, -1):
-        day = now - timedelta(days=i)
-        days_header += day.strftime("%a") + " "
-    msg += f"`{days_header}`\n"
+    days_header = "          " + "".join(day.strftime("%a") + " " for day in days)
+    parts.append(f"`{days_header}`\n")
 
     for emp_id, info in config.STAFF_RECORDS.items():
-        row = f"`{emp_id:6s}` "
+        parts.append(f"`{emp_id:6s}` ")
         submitted = 0
-        for i in range(6, -1, -1):
-            day = now - timedelta(days=i)
-            day_str = day.strftime("%Y-%m-%d")
-            day_log = daily_log.get(day_str, {})
-            day_leaves = leave_log.get(day_str, {})
-
+        for day_log, day_leaves in week_logs:
             if emp_id in day_log:
-                row += " ✅ "
+                parts.append(" ✅ ")
                 submitted += 1
             elif emp_id in day_leaves:
-                row += " 🏖 "
+                parts.append(" 🏖 ")
             else:
-                row += " ❌ "
-        row += f" ({submitted}/7)"
-        msg += row + "\n"
+                parts.append(" ❌ ")
+        parts.append(f" ({submitted}/7)\n")
 
-    msg += "\n✅=Submitted  ❌=Absent  🏖=Leave"
+    parts.append("\n✅=Submitted  ❌=Absent  🏖=Leave")
 
-    try:
-        await context.bot.send_message(chat_id=update.effective_user.id, text=msg, parse_mode="Markdown")
-        if update.message.chat.type != "private":
-            await update.message.reply_text("📩 Weekly report sent to your DM!", parse_mode="Markdown")
-    except Exception:
-        await update.message.reply_text(msg, parse_mode="Markdown")
+    await _send_report_dm(update, context, "".join(parts), "📩 Weekly report sent to your DM!")
 
     logger.info("Weekly report generated")
 
 
+@config.admin_only
 async def monthly_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Monthly attendance summary (sent to admin DM)."""
-    user_id = str(update.effective_user.id)
-    if not _is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
-
-    tz = pytz.timezone(config.TIMEZONE)
-    now = datetime.now(tz)
-    daily_log = config.load_daily_log()
-    leave_log = config.load_leave_log()
+    now = datetime.now(config.TZ)
+    daily_log = config.get_daily_log(context)
+    leave_log = config.get_leave_log(context)
 
     # Count all days this month (all days are working — no weekends)
     first_day = now.replace(day=1)
-    working_days = 0
-    current = first_day
-    while current <= now:
-        working_days += 1
-        current += timedelta(days=1)
+    day_strs = [(first_day + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(now.day)]
+    working_days = len(day_strs)
+
+    # One pass over the month's days, tallying every employee at once
+    submitted = dict.fromkeys(config.STAFF_RECORDS, 0)
+    late = dict.fromkeys(config.STAFF_RECORDS, 0)
+    leaves = dict.fromkeys(config.STAFF_RECORDS, 0)
+    for day_str in day_strs:
+        for emp_id, entry in daily_log.get(day_str, {}).items():
+            if emp_id in submitted:
+                submitted[emp_id] += 1
+                if isinstance(entry, dict) and entry.get("late"):
+                    late[emp_id] += 1
+        for emp_id in leave_log.get(day_str, {}):
+            if emp_id in leaves:
+                leaves[emp_id] += 1
 
-    msg = f"📊 *Monthly Report — {now.strftime('%B %Y')}*\n"
-    msg += f"📅 Working days so far: {working_days}\n"
-    msg += "━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    parts = [
+        f"📊 *Monthly Report — {now.strftime('%B %Y')}*\n",
+        f"📅 Working days so far: {working_days}\n",
+        "━━━━━━━━━━━━━━━━━━━━━━\n\n",
+    ]
 
     for emp_id, info in config.STAFF_RECORDS.items():
-        submitted = 0
-        late = 0
-        leaves = 0
-
-        current = first_day
-        while current <= now:
-            day_str = current.strftime("%Y-%m-%d")
-            if emp_id in daily_log.get(day_str, {}):
-                submitted += 1
-                entry = daily_log[day_str][emp_id]
-                if isinstance(entry, dict) and entry.get("late"):
-                    late += 1
-            if emp_id in leave_log.get(day_str, {}):
-                leaves += 1
-            current += timedelta(days=1)
-
-        pct = round((submitted / working_days) * 100) if working_days > 0 else 0
+        pct = round((submitted[emp_id] / working_days) * 100) if working_days > 0 else 0
         pct_bar = "█" * (pct // 10) + "░" * (10 - pct // 10)
 
-        msg += f"*{info['name']}* (`{emp_id}`)\n"
-        msg += f"  {pct_bar} {pct}%\n"
-        msg += f"  ✅ {submitted} days | ⏰ {late} late | 🏖️ {leaves} leave\n\n"
+        parts.append(
+            f"*{info['name']}* (`{emp_id}`)\n"
+            f"  {pct_bar} {pct}%\n"
+            f"  ✅ {submitted[emp_id]} days | ⏰ {late[emp_id]} late | 🏖️ {leaves[emp_id]} leave\n\n"
+        )
 
-    try:
-        await context.bot.send_message(chat_id=update.effective_user.id, text=msg, parse_mode="Markdown")
-        if update.message.chat.type != "private":
-            await update.message.reply_text("📩 Monthly report sent to your DM!", parse_mode="Markdown")
-    except Exception:
-        await update.message.reply_text(msg, parse_mode="Markdown")
+    await _send_report_dm(update, context, "".join(parts), "📩 Monthly report sent to your DM!")
 
     logger.info("Monthly report generated")
 
 
+@config.admin_only
 async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send the Excel file or Google Sheet link to admin DM."""
-    user_id = str(update.effective_user.id)
-    if not _is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
+    chat_id = update.effective_user.id
 
-    sent = False
-
-    # Send Excel file
-    if os.path.exists(config.EXCEL_FILE):
+    async def send_excel():
+        # Generate the Excel file from the CSV store
+        if not await build_excel_export_async(config.EXCEL_FILE):
+            return False
         try:
             with open(config.EXCEL_FILE, "rb") as f:
                 await context.bot.send_document(
-                    chat_id=update.effective_user.id,
+                    chat_id=chat_id,
                     document=f,
                     filename=config.EXCEL_FILE,
                     caption="📊 Employee Updates — Excel File",
                 )
-            sent = True
+            return True
         except Exception as e:
             logger.warning(f"Failed to send Excel file: {e}")
+            return False
 
-    # Send Google Sheet link
-    if config.GOOGLE_SHEET_ID:
+    async def send_sheet_link():
+        if not config.GOOGLE_SHEET_ID:
+            return False
         link = f"https://docs.google.com/spreadsheets/d/{config.GOOGLE_SHEET_ID}/edit"
         try:
             await context.bot.send_message(
-                chat_id=update.effective_user.id,
+                chat_id=chat_id,
                 text=f"📋 *Google Sheet:*\n[Open Sheet]({link})",
                 parse_mode="Markdown",
             )
-            sent = True
+            return True
         except Exception as e:
             logger.warning(f"Failed to send Sheet link: {e}")
+            return False
+
+    # The Sheet link doesn't have to wait for the workbook build
+    sent = any(await asyncio.gather(send_excel(), send_sheet_link()))
 
     if sent:
         if update.message.chat.type != "private":
@@ -321,13 +303,9 @@ async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info("Export sent")
 
 
+@config.admin_only
 async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Bot sends an announcement message to the group."""
-    user_id = str(update.effective_user.id)
-    if not _is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
-
     if not context.args:
         await update.message.reply_text("❗ *Usage:* `/broadcast Your message here`", parse_mode="Markdown")
         return
@@ -346,13 +324,9 @@ async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"Broadcast by {admin_name}: {text[:50]}")
 
 
+@config.admin_only
 async def deadline_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Set or view the daily submission deadline."""
-    user_id = str(update.effective_user.id)
-    if not _is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
-
     if not context.args:
         current = config.get_deadline()
         await update.message.reply_text(f"⏰ Current deadline: *{current}*\n\nTo change: `/deadline HH:MM`", parse_mode="Markdown")
@@ -383,7 +357,7 @@ async def sethr_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
 
     # Owner only
-    if user_id != str(config.OWNER_CHAT_ID) and not config.is_owner(user_id):
+    if not config.is_owner(user_id):
         await update.message.reply_text("🚫 *Permission Denied:* Only the Owner can change HR.", parse_mode="Markdown")
         return
 
@@ -397,6 +371,7 @@ async def sethr_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     new_hr_id = context.args[0]
     config.HR_CHAT_ID = new_hr_id
+    config.refresh_admin_ids()
     config.save_setting("hr_chat_id", new_hr_id)
 
     await update.message.reply_text(
@@ -408,12 +383,10 @@ async def sethr_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ─── Private Chat Commands (Owner & HR) ──────────────────────────────────────
 
+@config.admin_only
 async def announce_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a styled announcement to the group chat (from private chat)."""
     user_id = str(update.effective_user.id)
-    if not _is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
 
     if not context.args:
         await update.message.reply_text(
@@ -440,7 +413,7 @@ async def announce_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"━━━━━━━━━━━━━━━━━━━━━━\n\n"
         f"{text}\n\n"
         f"— _{role}: {admin_name}_\n"
-        f"📅 _{datetime.now(pytz.timezone(config.TIMEZONE)).strftime('%d %b %Y, %I:%M %p')}_"
+        f"📅 _{datetime.now(config.TZ).strftime('%d %b %Y, %I:%M %p')}_"
     )
 
     try:
@@ -454,12 +427,10 @@ async def announce_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Announce failed: {e}")
 
 
+@config.admin_only
 async def dm_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a private message to a specific employee."""
     user_id = str(update.effective_user.id)
-    if not _is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
 
     if len(context.args) < 2:
         await update.message.reply_text(
@@ -512,13 +483,9 @@ async def dm_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"DM failed for {emp_id}: {e}")
 
 
+@config.admin_only
 async def remind_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send reminders to all employees who haven't submitted today."""
-    user_id = str(update.effective_user.id)
-    if not _is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
-
     group_id = config.GROUP_CHAT_ID
     if not group_id:
         await update.message.reply_text(
@@ -527,15 +494,11 @@ async def remind_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    tz = pytz.timezone(config.TIMEZONE)
-    now = datetime.now(tz)
+    now = datetime.now(config.TZ)
     today_str = now.strftime("%Y-%m-%d")
 
-    if "daily_log" not in context.bot_data:
-        context.bot_data["daily_log"] = config.load_daily_log()
-
-    today_log = context.bot_data.get("daily_log", {}).get(today_str, {})
-    leave_log = config.load_leave_log()
+    today_log = config.get_daily_log(context).get(today_str, {})
+    leave_log = config.get_leave_log(context)
     today_leaves = leave_log.get(today_str, {})
 
     pending = []
@@ -576,12 +539,10 @@ async def remind_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Remind failed: {e}")
 
 
+@config.admin_only
 async def warning_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send an official warning to an employee's DM."""
     user_id = str(update.effective_user.id)
-    if not _is_admin(user_id):
-        await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
-        return
 
     if len(context.args) < 2:
         await update.message.reply_text(
@@ -602,8 +563,7 @@ async def warning_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     staff_name = staff_info["name"]
     admin_name = update.effective_user.first_name or "Admin"
     role = "Owner" if config.is_owner(user_id) else "HR"
-    tz = pytz.timezone(config.TIMEZONE)
-    now = datetime.now(tz)
+    now = datetime.now(config.TZ)
 
     tg_id = staff_info.get("telegram_id", "")
 
@@ -617,27 +577,32 @@ async def warning_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"— *{role}: {admin_name}*"
     )
 
-    sent_to_employee = False
+    employee_chat_id = None
     if tg_id:
         try:
-            await context.bot.send_message(
-                chat_id=int(tg_id), text=warning_msg, parse_mode="Markdown",
-            )
-            sent_to_employee = True
-        except Exception as e:
-            logger.warning(f"Warning DM failed for {emp_id}: {e}")
-
-    # Also notify the other admin
-    for admin_id in config.OWNER_CHAT_IDS + ([config.HR_CHAT_ID] if config.HR_CHAT_ID else []):
-        if admin_id and str(admin_id) != user_id:
-            try:
-                await context.bot.send_message(
-                    chat_id=int(admin_id),
-                    text=f"📋 *Warning Issued*\n\n{admin_name} ({role}) warned `{emp_id}` ({staff_name})\n\n_Reason: {reason}_",
-                    parse_mode="Markdown",
-                )
-            except Exception:
-                pass
+            employee_chat_id = int(tg_id)
+        except ValueError:
+            logger.warning(f"Warning DM failed for {emp_id}: bad telegram_id {tg_id!r}")
+
+    # Employee DM and the other admins' notices go out together
+    admin_notice = f"📋 *Warning Issued*\n\n{admin_name} ({role}) warned `{emp_id}` ({staff_name})\n\n_Reason: {reason}_"
+    admin_sends = [
+        context.bot.send_message(chat_id=admin_id, text=admin_notice, parse_mode="Markdown")
+        for admin_id in config.ADMIN_CHAT_ID_INTS
+        if admin_id != update.effective_user.id
+    ]
+    if employee_chat_id is None:
+        await asyncio.gather(*admin_sends, return_exceptions=True)
+        sent_to_employee = False
+    else:
+        employee_result, *_ = await asyncio.gather(
+            context.bot.send_message(chat_id=employee_chat_id, text=warning_msg, parse_mode="Markdown"),
+            *admin_sends,
+            return_exceptions=True,
+        )
+        sent_to_employee = not isinstance(employee_result, Exception)
+        if not sent_to_employee:
+            logger.warning(f"Warning DM failed for {emp_id}: {employee_result}")
 
     if sent_to_employee:
         await update.message.reply_text(
@@ -6,7 +6,6 @@ Commands: /mystatus, /myprofile, /edit, /leave
 import logging
 from datetime import datetime, timedelta
 
-import pytz
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
@@ -34,19 +33,14 @@ async def mystatus_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     staff_info = config.STAFF_RECORDS[emp_id]
-    tz = pytz.timezone(config.TIMEZONE)
-    now = datetime.now(tz)
+    now = datetime.now(config.TZ)
 
-    if "daily_log" not in context.bot_data:
-        context.bot_data["daily_log"] = config.load_daily_log()
-
-    # Also try to load from Google Sheets for real-time data on Railway
-    daily_log = context.bot_data.get("daily_log", {})
+    daily_log = config.get_daily_log(context)
 
     # Check last 7 days (all days are working — no weekends)
     days_status = []
     submitted_count = 0
-    leave_log = config.load_leave_log()
+    leave_log = config.get_leave_log(context)
 
     for i in range(6, -1, -1):
         day = now - timedelta(days=i)
@@ -109,10 +103,8 @@ async def myprofile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     staff_info = config.STAFF_RECORDS[emp_id]
 
-    # Count total submissions (use in-memory data first, fallback to file)
-    if "daily_log" not in context.bot_data:
-        context.bot_data["daily_log"] = config.load_daily_log()
-    daily_log = context.bot_data["daily_log"]
+    # Count total submissions
+    daily_log = config.get_daily_log(context)
 
     total_submissions = 0
     for date_str, log in daily_log.items():
@@ -120,7 +112,7 @@ async def myprofile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             total_submissions += 1
 
     # Count leaves
-    leave_log = config.load_leave_log()
+    leave_log = config.get_leave_log(context)
     total_leaves = 0
     for date_str, leaves in leave_log.items():
         if emp_id in leaves:
@@ -172,8 +164,7 @@ async def edit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     staff_name = config.STAFF_RECORDS[emp_id]["name"]
-    tz = pytz.timezone(config.TIMEZONE)
-    now = datetime.now(tz)
+    now = datetime.now(config.TZ)
     group_name = update.message.chat.title or "Private Chat"
     chat_id = str(update.message.chat.id)
 
@@ -189,9 +180,7 @@ async def edit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
     # Store the new text temporarily
-    if "pending_edits" not in context.bot_data:
-        context.bot_data["pending_edits"] = {}
-    context.bot_data["pending_edits"][emp_id] = {
+    context.bot_data.setdefault("pending_edits", {})[emp_id] = {
         "new_text": new_text,
         "date": now.strftime("%d-%m-%Y"),
     }
@@ -207,21 +196,20 @@ async def edit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # If Owner is requesting, only send to HR
     requester_id = str(requester.id)
     if requester_id == str(config.HR_CHAT_ID):
-        approval_targets = list(config.OWNER_CHAT_IDS)
+        approval_targets = config.OWNER_CHAT_ID_INTS
     elif config.is_owner(requester_id):
-        approval_targets = [config.HR_CHAT_ID]
+        approval_targets = [config.HR_CHAT_ID_INT] if config.HR_CHAT_ID_INT is not None else []
     else:
-        approval_targets = list(config.OWNER_CHAT_IDS) + ([config.HR_CHAT_ID] if config.HR_CHAT_ID else [])
+        approval_targets = config.ADMIN_CHAT_ID_INTS
 
     for admin_id in approval_targets:
-        if admin_id:
-            try:
-                await context.bot.send_message(
-                    chat_id=int(admin_id), text=approval_msg,
-                    parse_mode="Markdown", reply_markup=keyboard,
-                )
-            except Exception as e:
-                logger.warning(f"Failed to send edit request to {admin_id}: {e}")
+        try:
+            await context.bot.send_message(
+                chat_id=admin_id, text=approval_msg,
+                parse_mode="Markdown", reply_markup=keyboard,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to send edit request to {admin_id}: {e}")
 
     await update.message.reply_text(
         f"📨 *Edit Request Sent!*\nYour edit request for `{emp_id}` has been sent to Owner & HR for approval.",
@@ -256,8 +244,7 @@ async def leave_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Smart date parsing
-    tz = pytz.timezone(config.TIMEZONE)
-    now = datetime.now(tz)
+    now = datetime.now(config.TZ)
     second_arg = context.args[1].lower() if len(context.args) > 1 else ""
 
     if second_arg == "today":
@@ -269,8 +256,8 @@ async def leave_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         # Try to parse as date DD-MM-YYYY
         try:
-            datetime.strptime(second_arg, "%d-%m-%Y")
-            leave_date = second_arg
+            # Normalise to zero-padded DD-MM-YYYY ("5-3-2026" -> "05-03-2026") for keys and callback_data
+            leave_date = datetime.strptime(second_arg, "%d-%m-%Y").strftime("%d-%m-%Y")
             reason = " ".join(context.args[2:]) if len(context.args) > 2 else "Personal"
         except ValueError:
             # Not a date — treat everything after EMP_ID as reason, default to today
@@ -284,9 +271,7 @@ async def leave_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     display_date = datetime.strptime(leave_date, "%d-%m-%Y").strftime("%d %b %Y")
 
     # Store pending leave
-    if "pending_leaves" not in context.bot_data:
-        context.bot_data["pending_leaves"] = {}
-    context.bot_data["pending_leaves"][f"{emp_id}:{leave_date}"] = {
+    context.bot_data.setdefault("pending_leaves", {})[f"{emp_id}:{leave_date}"] = {
         "emp_id": emp_id, "name": staff_name, "dept": dept,
         "date": leave_date, "reason": reason,
     }
@@ -314,21 +299,20 @@ async def leave_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # If Owner is requesting, only send to HR
     requester_id = str(requester.id)
     if requester_id == str(config.HR_CHAT_ID):
-        approval_targets = list(config.OWNER_CHAT_IDS)
+        approval_targets = config.OWNER_CHAT_ID_INTS
     elif config.is_owner(requester_id):
-        approval_targets = [config.HR_CHAT_ID]
+        approval_targets = [config.HR_CHAT_ID_INT] if config.HR_CHAT_ID_INT is not None else []
     else:
-        approval_targets = list(config.OWNER_CHAT_IDS) + ([config.HR_CHAT_ID] if config.HR_CHAT_ID else [])
+        approval_targets = config.ADMIN_CHAT_ID_INTS
 
     for admin_id in approval_targets:
-        if admin_id:
-            try:
-                await context.bot.send_message(
-                    chat_id=int(admin_id), text=approval_msg,
-                    parse_mode="Markdown", reply_markup=keyboard,
-                )
-            except Exception as e:
-                logger.warning(f"Failed to send leave request to {admin_id}: {e}")
+        try:
+            await context.bot.send_message(
+                chat_id=admin_id, text=approval_msg,
+                parse_mode="Markdown", reply_markup=keyboard,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to send leave request to {admin_id}: {e}")
 
     await update.message.reply_text(
         f"📨 *Leave Request Sent!*\nLeave for `{emp_id}` on *{display_date}* sent to Owner & HR for approval.",
@@ -6,7 +6,10 @@ Supports Railway deployment via GOOGLE_CREDS_JSON env var.
 
 import os
 import json
+import asyncio
 import logging
+import functools
+import threading
 
 # Load .env file if it exists (must be before any os.getenv calls)
 try:
@@ -14,8 +17,14 @@ try:
     load_dotenv()
 except ImportError:
     pass
-import pytz
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+# Faster JSON for the daily log; falls back to the stdlib module
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
@@ -31,18 +40,80 @@ HR_CHAT_ID = os.getenv("HR_CHAT_ID", "")
 GROUP_CHAT_ID = os.getenv("GROUP_CHAT_ID", "")  # Auto-detected from messages or set manually
 
 
+def _chat_ids(values):
+    """Convert chat ID strings to ints once, skipping blank or invalid values."""
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            if value:
+                logger.warning(f"Ignoring invalid chat ID: {value!r}")
+    return ids
+
+
+# Owner/HR IDs for permission checks and sends (rebuilt by refresh_admin_ids)
+OWNER_IDS = frozenset()
+ADMIN_IDS = frozenset()  # Owners + HR, as strings
+OWNER_CHAT_ID_INTS = []
+HR_CHAT_ID_INT = None
+ADMIN_CHAT_ID_INTS = []  # Owners, then HR
+
+# (chat_id as int, label) pairs that receive work-update notifications
+NOTIFY_TARGETS = []
+
+
+def refresh_admin_ids():
+    """Rebuild the admin ID sets and parsed chat IDs after OWNER_CHAT_IDS or HR_CHAT_ID change."""
+    global OWNER_IDS, ADMIN_IDS, OWNER_CHAT_ID_INTS, HR_CHAT_ID_INT, ADMIN_CHAT_ID_INTS, NOTIFY_TARGETS
+    OWNER_IDS = frozenset(OWNER_CHAT_IDS)
+    ADMIN_IDS = OWNER_IDS | ({str(HR_CHAT_ID)} if HR_CHAT_ID else set())
+    OWNER_CHAT_ID_INTS = _chat_ids(OWNER_CHAT_IDS)
+    hr_ids = _chat_ids([HR_CHAT_ID])
+    HR_CHAT_ID_INT = hr_ids[0] if hr_ids else None
+    ADMIN_CHAT_ID_INTS = OWNER_CHAT_ID_INTS + hr_ids
+    NOTIFY_TARGETS = [(cid, "Owner") for cid in OWNER_CHAT_ID_INTS] + [(cid, "HR") for cid in hr_ids]
+
+
+# Legacy Markdown entity characters, backslash-escaped in user-supplied text
+_MD_ESCAPE = str.maketrans({c: "\\" + c for c in "_*`["})
+
+
+def escape_md(text):
+    """Escape user text for messages sent with parse_mode="Markdown"."""
+    return str(text).translate(_MD_ESCAPE)
+
+
 def is_owner(user_id):
     """Check if user_id is any of the owner IDs."""
-    return str(user_id) in OWNER_CHAT_IDS
+    return str(user_id) in OWNER_IDS
 
 
 def is_admin(user_id):
     """Check if user_id is Owner or HR."""
-    uid = str(user_id)
-    return uid in OWNER_CHAT_IDS or uid == str(HR_CHAT_ID)
+    return str(user_id) in ADMIN_IDS
+
+
+def admin_only(handler):
+    """Command decorator: reply Permission Denied unless the user is Owner or HR."""
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        if str(update.effective_user.id) not in ADMIN_IDS:
+            await update.message.reply_text("🚫 *Permission Denied*", parse_mode="Markdown")
+            return
+        return await handler(update, context)
+    return wrapper
+
+refresh_admin_ids()
+
+# ─── Webhook (optional, long polling is used when WEBHOOK_URL is empty) ─────
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")  # public https base URL
+WEBHOOK_PORT = int(os.getenv("PORT", "8443"))
 
 # ─── Excel Configuration ─────────────────────────────────────────────────────
-EXCEL_FILE = os.getenv("EXCEL_FILE", "employee_updates.xlsx")
+EXCEL_FILE = os.getenv("EXCEL_FILE", "employee_updates.xlsx")  # generated on /export
+UPDATES_CSV_FILE = os.getenv("UPDATES_CSV_FILE", "employee_updates.csv")
+LEAVES_CSV_FILE = os.getenv("LEAVES_CSV_FILE", "leave_register.csv")
 
 # ─── Google Sheets Configuration ─────────────────────────────────────────────
 GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID", "1GwQLgeGA-ymsiYRrbuxyKDtnE-CLu3NDUvsSAsXxA9A")
@@ -64,6 +135,7 @@ IS_RAILWAY = bool(os.getenv("RAILWAY_ENVIRONMENT", ""))
 
 # ─── Timezone ────────────────────────────────────────────────────────────────
 TIMEZONE = os.getenv("TIMEZONE", "Asia/Kolkata")
+TZ = ZoneInfo(TIMEZONE)
 
 # ─── Submission Deadline ─────────────────────────────────────────────────────
 SUBMISSION_DEADLINE = os.getenv("SUBMISSION_DEADLINE", "11:00")  # 24h format HH:MM
@@ -94,6 +166,8 @@ def save_setting(key, value):
     try:
         with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
             json.dump(settings, f, indent=2)
+        if key == "deadline":
+            get_deadline_hm.cache_clear()
         return True
     except Exception as e:
         logger.warning(f"Error saving {SETTINGS_FILE}: {e}")
@@ -112,7 +186,8 @@ def load_staff_records():
     if os.path.exists(STAFF_JSON_FILE):
         try:
             with open(STAFF_JSON_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+                # Keys are matched against upper-cased IDs, so normalise hand edits
+                return {emp_id.upper(): info for emp_id, info in json.load(f).items()}
         except Exception as e:
             logger.warning(f"Error loading {STAFF_JSON_FILE}: {e}")
 
@@ -132,33 +207,34 @@ def load_staff_records():
 
 
 def save_staff_record(emp_id, name, dept):
-    """Add or update a staff record."""
-    records = load_staff_records()
-    records[emp_id.upper()] = {"name": name, "dept": dept.upper()}
-    try:
-        with open(STAFF_JSON_FILE, "w", encoding="utf-8") as f:
-            json.dump(records, f, indent=4)
-        return True
-    except Exception as e:
-        logger.warning(f"Error saving {STAFF_JSON_FILE}: {e}")
-        return False
+    """Add or update a staff record in STAFF_RECORDS and persist it.
+
+    Returns the saved record, or None if the file could not be written.
+    """
+    emp_id = emp_id.upper()
+    previous = STAFF_RECORDS.get(emp_id)
+    record = dict(previous or {}, name=name, dept=dept.upper())
+    STAFF_RECORDS[emp_id] = record
+    if save_staff_records(STAFF_RECORDS):
+        return record
+    # Roll back the in-memory change
+    if previous is None:
+        del STAFF_RECORDS[emp_id]
+    else:
+        STAFF_RECORDS[emp_id] = previous
+    return None
 
 
 def remove_staff_record(emp_id):
-    """Remove a staff record."""
-    records = load_staff_records()
+    """Remove a staff record from STAFF_RECORDS and persist the change."""
     emp_id = emp_id.upper()
-    if emp_id not in records:
+    if emp_id not in STAFF_RECORDS:
         return False
-    del records[emp_id]
-    try:
-        with open(STAFF_JSON_FILE, "w", encoding="utf-8") as f:
-            json.dump(records, f, indent=4)
+    previous = STAFF_RECORDS.pop(emp_id)
+    if save_staff_records(STAFF_RECORDS):
         return True
-    except Exception as e:
-        logger.warning(f"Error saving {STAFF_JSON_FILE}: {e}")
-        return False
-
+    STAFF_RECORDS[emp_id] = previous
+    return False
 
 
 def save_staff_records(records):
@@ -176,59 +252,308 @@ STAFF_RECORDS = load_staff_records()
 
 
 # ─── Daily Log ───────────────────────────────────────────────────────────────
+def _dumps(data):
+    """Serialize to indented UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode("utf-8")
+
+
+def _loads(payload):
+    """Parse JSON bytes."""
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def _dumps_line(data):
+    """Serialize to one compact JSON line (bytes, newline-terminated)."""
+    if orjson is not None:
+        return orjson.dumps(data) + b"\n"
+    return json.dumps(data, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+# The log is a JSON snapshot plus an append-only journal of changes since the
+# snapshot. Each journal line is {"d": date, "e": emp_id, "v": entry or null}.
+# The snapshot is rewritten (and the journal emptied) at startup, shutdown and
+# once the journal reaches DAILY_LOG_COMPACT_LINES.
+DAILY_LOG_JOURNAL_FILE = "daily_log.jsonl"
+DAILY_LOG_COMPACT_LINES = 1000
+DAILY_LOG_FLUSH_DELAY = 2.0
+_DAILY_LOG_WRITE_LOCK = threading.Lock()
+_journal_lines = 0
+_journal_pending = []
+_daily_log_dirty = None
+_daily_log_task = None
+
+
 def load_daily_log():
-    """Load daily submission log."""
+    """Load daily submission log (snapshot, then replay the journal)."""
+    global _journal_lines
+    log_data = {}
     if os.path.exists(DAILY_LOG_FILE):
         try:
-            with open(DAILY_LOG_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with open(DAILY_LOG_FILE, "rb") as f:
+                log_data = _loads(f.read())
         except Exception as e:
             logger.warning(f"Error loading {DAILY_LOG_FILE}: {e}")
-    return {}
 
+    _journal_lines = 0
+    if os.path.exists(DAILY_LOG_JOURNAL_FILE):
+        try:
+            with open(DAILY_LOG_JOURNAL_FILE, "rb") as f:
+                for line in f:
+                    try:
+                        event = _loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    _apply_daily_event(log_data, event["d"], event["e"], event["v"])
+                    _journal_lines += 1
+        except Exception as e:
+            logger.warning(f"Error loading {DAILY_LOG_JOURNAL_FILE}: {e}")
+    return log_data
 
-def save_daily_log(log_data):
-    """Save daily submission log."""
+
+def _apply_daily_event(log_data, date, emp_id, entry):
+    if entry is None:
+        day_log = log_data.get(date)
+        if day_log:
+            day_log.pop(emp_id, None)
+    else:
+        log_data.setdefault(date, {})[emp_id] = entry
+
+
+def get_daily_log(context):
+    """Return the in-memory daily log, loading it from disk if post_init hasn't."""
+    daily_log = context.bot_data.get("daily_log")
+    if daily_log is None:
+        daily_log = context.bot_data["daily_log"] = load_daily_log()
+    return daily_log
+
+
+def _append_journal(lines):
+    """Append serialized events to the journal."""
+    try:
+        with _DAILY_LOG_WRITE_LOCK:
+            with open(DAILY_LOG_JOURNAL_FILE, "ab") as f:
+                f.write(b"".join(lines))
+    except Exception as e:
+        logger.warning(f"Error saving {DAILY_LOG_JOURNAL_FILE}: {e}")
+
+
+def _write_daily_snapshot(payload):
+    """Atomically replace the snapshot with already-serialized JSON bytes and empty the journal."""
+    tmp_path = DAILY_LOG_FILE + ".tmp"
     try:
-        with open(DAILY_LOG_FILE, "w", encoding="utf-8") as f:
-            json.dump(log_data, f, indent=2)
+        with _DAILY_LOG_WRITE_LOCK:
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, DAILY_LOG_FILE)
+            open(DAILY_LOG_JOURNAL_FILE, "wb").close()
     except Exception as e:
         logger.warning(f"Error saving {DAILY_LOG_FILE}: {e}")
 
 
+def save_daily_log(log_data):
+    """Save the full daily submission log as a new snapshot."""
+    global _journal_lines
+    _journal_pending.clear()
+    _journal_lines = 0
+    _write_daily_snapshot(_dumps(log_data))
+
+
+async def _flush_daily_log(log_data):
+    """Write queued events, compacting once the journal is long enough.
+
+    Serialization happens on the event loop so handlers can't mutate mid-dump.
+    """
+    global _journal_lines
+    lines = _journal_pending[:]
+    _journal_pending.clear()
+    if _journal_lines + len(lines) >= DAILY_LOG_COMPACT_LINES:
+        _journal_lines = 0
+        await asyncio.to_thread(_write_daily_snapshot, _dumps(log_data))
+    elif lines:
+        _journal_lines += len(lines)
+        await asyncio.to_thread(_append_journal, lines)
+
+
+async def _daily_log_flusher(log_data):
+    while True:
+        await _daily_log_dirty.wait()
+        await asyncio.sleep(DAILY_LOG_FLUSH_DELAY)
+        _daily_log_dirty.clear()
+        await _flush_daily_log(log_data)
+
+
+def start_daily_log_flusher(log_data):
+    """Start the debounced journal writer (call once the event loop is running)."""
+    global _daily_log_dirty, _daily_log_task
+    if _daily_log_task is not None:
+        return
+    _daily_log_dirty = asyncio.Event()
+    _daily_log_task = asyncio.create_task(_daily_log_flusher(log_data))
+
+
+async def stop_daily_log_flusher(log_data):
+    """Stop the writer and compact the log into a fresh snapshot."""
+    global _daily_log_task, _journal_lines
+    if _daily_log_task is None:
+        return
+    task, _daily_log_task = _daily_log_task, None
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    _journal_pending.clear()
+    _journal_lines = 0
+    await asyncio.to_thread(_write_daily_snapshot, _dumps(log_data))
+
+
+def _record_daily_event(date, emp_id, entry):
+    """Queue one journal line; written immediately if the writer isn't running."""
+    global _journal_lines
+    line = _dumps_line({"d": date, "e": emp_id, "v": entry})
+    if _daily_log_task is not None:
+        _journal_pending.append(line)
+        _daily_log_dirty.set()
+    else:
+        _journal_lines += 1
+        _append_journal([line])
+
+
+def record_daily_entry(log_data, date, emp_id, entry):
+    """Store a submission in the daily log and journal it."""
+    log_data.setdefault(date, {})[emp_id] = entry
+    _record_daily_event(date, emp_id, entry)
+
+
+def remove_daily_entry(log_data, date, emp_id):
+    """Drop a submission from the daily log; returns False if there was none."""
+    day_log = log_data.get(date)
+    if not day_log or emp_id not in day_log:
+        return False
+    del day_log[emp_id]
+    _record_daily_event(date, emp_id, None)
+    return True
+
+
 # ─── Leave Log ───────────────────────────────────────────────────────────────
 def load_leave_log():
     """Load leave request log."""
     if os.path.exists(LEAVE_LOG_FILE):
         try:
-            with open(LEAVE_LOG_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with open(LEAVE_LOG_FILE, "rb") as f:
+                return _loads(f.read())
         except Exception as e:
             logger.warning(f"Error loading {LEAVE_LOG_FILE}: {e}")
     return {}
 
 
-def save_leave_log(log_data):
-    """Save leave request log."""
+def get_leave_log(context):
+    """Return the in-memory leave log, loading it from disk if post_init hasn't."""
+    leave_log = context.bot_data.get("leave_log")
+    if leave_log is None:
+        leave_log = context.bot_data["leave_log"] = load_leave_log()
+    return leave_log
+
+
+_LEAVE_LOG_WRITE_LOCK = threading.Lock()
+_leave_log_dirty = None
+_leave_log_task = None
+
+
+def _write_leave_log(payload):
+    """Atomically replace the leave log file with already-serialized JSON bytes."""
+    tmp_path = LEAVE_LOG_FILE + ".tmp"
     try:
-        with open(LEAVE_LOG_FILE, "w", encoding="utf-8") as f:
-            json.dump(log_data, f, indent=2)
+        with _LEAVE_LOG_WRITE_LOCK:
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, LEAVE_LOG_FILE)
     except Exception as e:
         logger.warning(f"Error saving {LEAVE_LOG_FILE}: {e}")
 
 
+def save_leave_log(log_data):
+    """Save leave request log."""
+    _write_leave_log(_dumps(log_data))
+
+
+async def _leave_log_flusher(log_data):
+    # Same debounce as the daily log: one rewrite per burst of approvals
+    while True:
+        await _leave_log_dirty.wait()
+        await asyncio.sleep(DAILY_LOG_FLUSH_DELAY)
+        _leave_log_dirty.clear()
+        await asyncio.to_thread(_write_leave_log, _dumps(log_data))
+
+
+def start_leave_log_flusher(log_data):
+    """Start the debounced leave log writer (call once the event loop is running)."""
+    global _leave_log_dirty, _leave_log_task
+    if _leave_log_task is not None:
+        return
+    _leave_log_dirty = asyncio.Event()
+    _leave_log_task = asyncio.create_task(_leave_log_flusher(log_data))
+
+
+async def stop_leave_log_flusher(log_data):
+    """Stop the writer and save any pending changes."""
+    global _leave_log_task
+    if _leave_log_task is None:
+        return
+    task, _leave_log_task = _leave_log_task, None
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    if _leave_log_dirty.is_set():
+        await asyncio.to_thread(_write_leave_log, _dumps(log_data))
+
+
+def record_leave_approval(leave_log, emp_id, log_key, month_key, approved_by, reason):
+    """Record an approved leave in memory, bump the monthly counter and schedule a save.
+
+    Returns the employee's leave number for that month.
+    """
+    leave_log.setdefault(log_key, {})[emp_id] = {"approved_by": approved_by, "reason": reason}
+    month_counts = leave_log.setdefault("_monthly_counts", {}).setdefault(month_key, {})
+    leave_count = month_counts[emp_id] = month_counts.get(emp_id, 0) + 1
+    if _leave_log_task is not None:
+        _leave_log_dirty.set()
+    else:
+        save_leave_log(leave_log)
+    return leave_count
+
+
 def get_deadline():
     """Get the current submission deadline (dynamic or default)."""
     return get_setting("deadline", SUBMISSION_DEADLINE)
 
 
+@functools.lru_cache(maxsize=1)
+def get_deadline_hm():
+    """Deadline as an (hour, minute) tuple, or None if it can't be parsed.
+
+    Cached until save_setting changes the deadline.
+    """
+    try:
+        h, m = map(int, get_deadline().split(":"))
+        return h, m
+    except ValueError:
+        logger.warning(f"Invalid submission deadline: {get_deadline()!r}")
+        return None
+
+
 def get_attendance_date():
     """Get the current attendance date based on 1:00 PM cutoff.
     Before 1 PM -> yesterday
     After 1 PM -> today
     """
-    tz = pytz.timezone(TIMEZONE)
-    now = datetime.now(tz)
+    now = datetime.now(TZ)
     CUTOFF_HOUR = 13  # 1:00 PM
 
     if now.hour < CUTOFF_HOUR:
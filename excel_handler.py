@@ -1,12 +1,30 @@
 """
 Excel & Google Sheets handler for the Employee Work Update Bot.
-Handles saving, formatting, dashboard, leave register, and monthly sheets.
+Records updates and leaves in append-only CSV files and generates the
+formatted Excel export (monthly sheets, dashboard, leave register) on demand.
 """
 
 import os
+import csv
 import asyncio
 import logging
-from datetime import datetime
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+
+# Google Sheets sync is optional; without gspread only Excel is written
+try:
+    import gspread
+    from google.oauth2.service_account import Credentials
+except ImportError:
+    gspread = None
+    Credentials = None
 
 import config
 
@@ -21,367 +39,462 @@ HEADERS = [
     "Telegram User", "Revision"
 ]
 
+LEAVE_HEADERS = [
+    "Sr No", "Employee ID", "Name", "Department",
+    "Leave Date", "Reason", "Approved By", "Status",
+    "Leave #", "Deduction",
+]
+
+# Updates and leaves are appended to CSV files (config.UPDATES_CSV_FILE,
+# config.LEAVES_CSV_FILE); the styled .xlsx is generated from them on /export.
+_CSV_LOCK = threading.Lock()
+
+# CSV path -> {sheet name: last S.No.}, seeded by one read of the file
+_CSV_COUNTERS = {}
+
+# File writes run off the event loop; one worker keeps appends in order
+_EXCEL_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="excel")
+
+# Google Sheets calls get their own small pool so a slow API call can't hold
+# up local file writes or the default executor
+_SHEETS_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sheets")
+
+# ─── Excel Styles (built once, shared by every row) ──────────────────────────
+_EVEN_ROW_FILL = PatternFill(start_color="E8F0FE", end_color="E8F0FE", fill_type="solid")
+_ODD_ROW_FILL = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
+_DATA_FONT = Font(name="Arial", size=10)
+_DATA_ALIGN = Alignment(vertical="center", wrap_text=True)
+_CENTER_ALIGN = Alignment(horizontal="center", vertical="center")
+_THIN_SIDE = Side(style="thin", color="D0D0D0")
+_DATA_BORDER = Border(left=_THIN_SIDE, right=_THIN_SIDE, top=_THIN_SIDE, bottom=_THIN_SIDE)
+_ON_TIME_FONT = Font(name="Arial", size=10, color="228B22")
+_LATE_FONT = Font(name="Arial", size=10, color="DC143C")
+_SEP_FILL = PatternFill(start_color="D6E4F0", end_color="D6E4F0", fill_type="solid")
+_SEP_FONT = Font(name="Arial", size=10, bold=True, color="1B3A5C")
+
+_HEADER_FILL = PatternFill(start_color="1B3A5C", end_color="1B3A5C", fill_type="solid")
+_HEADER_FONT = Font(name="Arial", bold=True, color="FFFFFF", size=11)
+_HEADER_ALIGN = Alignment(horizontal="center", vertical="center", wrap_text=True)
+_HEADER_SIDE = Side(style="thin", color="B0B0B0")
+_HEADER_BORDER = Border(left=_HEADER_SIDE, right=_HEADER_SIDE, top=_HEADER_SIDE, bottom=_HEADER_SIDE)
+_DASH_HEADER_FILL = PatternFill(start_color="2E7D32", end_color="2E7D32", fill_type="solid")
+_LEAVE_HEADER_FILL = PatternFill(start_color="E65100", end_color="E65100", fill_type="solid")
+_DEDUCTION_FONT = Font(name="Arial", size=10, bold=True, color="DC143C")
+_DEDUCTION_FILL = PatternFill(start_color="FFE0E0", end_color="FFE0E0", fill_type="solid")
+
+_CENTER_COLUMNS = (1, 7, 8, 11, 12)
+
 
 def _get_month_sheet_name(date_obj=None):
     """Get the sheet name for the current month, e.g. 'Mar 2026'."""
     if date_obj is None:
-        import pytz
-        tz = pytz.timezone(config.TIMEZONE)
-        date_obj = datetime.now(tz)
+        date_obj = datetime.now(config.TZ)
     return date_obj.strftime("%b %Y")
 
 
+def _month_of(date_str):
+    """Monthly sheet name for a DD-MM-YYYY date string."""
+    try:
+        return _get_month_sheet_name(datetime.strptime(date_str, "%d-%m-%Y"))
+    except ValueError:
+        return _get_month_sheet_name()
+
+
 def _is_on_time(data):
     """Check if submission is on time — uses the on_time field from bot.py."""
     return data.get("on_time", "Yes") == "Yes"
 
 
-def save_to_excel(data: dict) -> bool:
-    """Save the update to a professionally formatted Excel file with monthly sheets."""
-    try:
-        from openpyxl import Workbook, load_workbook
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+# ─── CSV Store ───────────────────────────────────────────────────────────────
+def _read_csv(path):
+    """Return the data rows of a CSV store (header excluded)."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))[1:]
 
-        file_path = config.EXCEL_FILE
-        month_name = _get_month_sheet_name()
-        on_time = _is_on_time(data)
 
-        if os.path.exists(file_path):
-            wb = load_workbook(file_path)
-        else:
-            wb = Workbook()
-            # Remove default sheet
-            if "Sheet" in wb.sheetnames:
-                del wb["Sheet"]
+def _append_csv(path, headers, row):
+    """Append one row, writing the header first if the file is new."""
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if f.tell() == 0:
+            writer.writerow(headers)
+        writer.writerow(row)
 
-        # Get or create monthly sheet
-        if month_name in wb.sheetnames:
-            ws = wb[month_name]
-            next_row = ws.max_row + 1
 
-            # Check if new day → insert separator row
-            last_date = ws.cell(row=next_row - 1, column=2).value  # Date column (now 2nd)
-            current_date = data["date"]
-            if last_date and str(last_date) != str(current_date):
-                # Insert a day-separator row
-                sep_fill = PatternFill(start_color="D6E4F0", end_color="D6E4F0", fill_type="solid")
-                sep_font = Font(name="Arial", size=10, bold=True, color="1B3A5C")
-                ws.merge_cells(start_row=next_row, start_column=1, end_row=next_row, end_column=12)
-                sep_cell = ws.cell(row=next_row, column=1,
-                                  value=f"📅 {current_date} — {data['day']}")
-                sep_cell.fill = sep_fill
-                sep_cell.font = sep_font
-                sep_cell.alignment = Alignment(horizontal="center", vertical="center")
-                next_row += 1
-
-            sr_no = next_row - 1
-        else:
-            ws = wb.create_sheet(month_name, 0)
-            _format_header(ws)
-            next_row = 2
-            sr_no = 1
+def _next_sr_no(path, sheet, sheet_of):
+    """Next S.No. for a sheet, counted in memory after one read of the CSV."""
+    counters = _CSV_COUNTERS.get(path)
+    if counters is None:
+        counters = _CSV_COUNTERS[path] = {}
+        for row in _read_csv(path):
+            if row and row[0].isdigit():
+                counters[sheet_of(row)] = int(row[0])
+    counters[sheet] = counters.get(sheet, 0) + 1
+    return counters[sheet]
 
-        # Write data row
-        is_revision = data.get("is_resubmission", False)
-        row_data = [
-            sr_no,                          # 1. S.No.
-            data["date"],                   # 2. Date
-            data["day"],                    # 3. Day
-            data["emp_name"],               # 4. Employee Name
-            data["emp_id"],                 # 5. Emp ID
-            data["department"],             # 6. Department
-            data["time"],                   # 7. Submit Time
-            "✅ ON TIME" if on_time else "❌ LATE", # 8. Punctuality
-            data["work_update"],            # 9. Work Report
-            data["group_name"],             # 10. Source
-            data["username"],               # 11. Telegram User
-            "📝 Edited" if is_revision else "Original" # 12. Revision
-        ]
 
-        # Styling
-        if sr_no % 2 == 0:
-            row_fill = PatternFill(start_color="E8F0FE", end_color="E8F0FE", fill_type="solid")
-        else:
-            row_fill = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-
-        data_font = Font(name="Arial", size=10)
-        data_alignment = Alignment(vertical="center", wrap_text=True)
-        thin_border = Border(
-            left=Side(style="thin", color="D0D0D0"),
-            right=Side(style="thin", color="D0D0D0"),
-            top=Side(style="thin", color="D0D0D0"),
-            bottom=Side(style="thin", color="D0D0D0"),
-        )
-
-        for col_idx, value in enumerate(row_data, 1):
-            cell = ws.cell(row=next_row, column=col_idx, value=value)
-            cell.fill = row_fill
-            cell.font = data_font
-            cell.alignment = data_alignment
-            cell.border = thin_border
-
-        # Center-align specific columns
-        for col in [1, 7, 8, 11, 12]:
-            ws.cell(row=next_row, column=col).alignment = Alignment(
-                horizontal="center", vertical="center"
-            )
+def _update_sheet_of(row):
+    """Monthly sheet an update row belongs to."""
+    return _month_of(row[1]) if len(row) > 1 else ""
 
-        # Color the Punctuality cell (now column 8)
-        punct_cell = ws.cell(row=next_row, column=8)
-        if on_time:
-            punct_cell.font = Font(name="Arial", size=10, color="228B22")
-        else:
-            punct_cell.font = Font(name="Arial", size=10, color="DC143C")
 
-        # Update dashboard
-        _update_dashboard(wb)
+def _migrate_legacy_excel():
+    """Import rows from an .xlsx written before the CSV store existed (runs once)."""
+    if os.path.exists(config.UPDATES_CSV_FILE) or not os.path.exists(config.EXCEL_FILE):
+        return
+
+    def _as_csv_row(values, width):
+        values = ["" if v is None else v for v in values[:width]]
+        return values + [""] * (width - len(values))
+
+    updates, leaves = [], []
+    wb = load_workbook(config.EXCEL_FILE, read_only=True)
+    try:
+        for ws in wb.worksheets:
+            if ws.title == "Dashboard":
+                continue
+            for values in ws.iter_rows(min_row=2, values_only=True):
+                if ws.title == "Leave Register":
+                    if len(values) > 1 and values[1]:
+                        leaves.append(_as_csv_row(values, len(LEAVE_HEADERS)))
+                elif len(values) > 4 and values[4]:  # day separators have no Emp ID
+                    updates.append(_as_csv_row(values, len(HEADERS)))
+    finally:
+        wb.close()
+
+    # Monthly sheets were stored newest first; the CSV is chronological
+    def _date_key(row):
+        try:
+            return datetime.strptime(str(row[1]), "%d-%m-%Y")
+        except ValueError:
+            return datetime.min
+    updates.sort(key=_date_key)
+
+    for path, headers, rows in [
+        (config.UPDATES_CSV_FILE, HEADERS, updates),
+        (config.LEAVES_CSV_FILE, LEAVE_HEADERS, leaves),
+    ]:
+        if os.path.exists(path):
+            continue
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            writer.writerows(rows)
+    logger.info(f"Excel: Migrated {len(updates)} update(s) and {len(leaves)} leave(s) "
+                f"from {config.EXCEL_FILE} to CSV")
+
 
-        wb.save(file_path)
-        logger.info(f"Excel: Saved update #{sr_no} to {month_name}")
+def save_to_csv(data: dict) -> bool:
+    """Append the update to the CSV store (one O(1) write; no workbook rewrite)."""
+    try:
+        on_time = _is_on_time(data)
+        is_revision = data.get("is_resubmission", False)
+        with _CSV_LOCK:
+            _migrate_legacy_excel()
+            path = config.UPDATES_CSV_FILE
+            sr_no = _next_sr_no(path, _month_of(data["date"]), _update_sheet_of)
+            _append_csv(path, HEADERS, [
+                sr_no,                          # 1. S.No.
+                data["date"],                   # 2. Date
+                data["day"],                    # 3. Day
+                data["emp_name"],               # 4. Employee Name
+                data["emp_id"],                 # 5. Emp ID
+                data["department"],             # 6. Department
+                data["time"],                   # 7. Submit Time
+                "✅ ON TIME" if on_time else "❌ LATE", # 8. Punctuality
+                data["work_update"],            # 9. Work Report
+                data["group_name"],             # 10. Source
+                data["username"],               # 11. Telegram User
+                "📝 Edited" if is_revision else "Original" # 12. Revision
+            ])
+        logger.debug(f"Excel: Recorded update #{sr_no} for {data['emp_id']}")
         return True
 
     except Exception as e:
+        _CSV_COUNTERS.pop(config.UPDATES_CSV_FILE, None)
         logger.error(f"Excel save failed: {e}", exc_info=True)
         return False
 
 
-def _format_header(ws):
-    """Apply professional header formatting to a worksheet."""
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-
-    header_fill = PatternFill(start_color="1B3A5C", end_color="1B3A5C", fill_type="solid")
-    header_font = Font(name="Arial", bold=True, color="FFFFFF", size=11)
-    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    thin_border = Border(
-        left=Side(style="thin", color="B0B0B0"),
-        right=Side(style="thin", color="B0B0B0"),
-        top=Side(style="thin", color="B0B0B0"),
-        bottom=Side(style="thin", color="B0B0B0"),
-    )
-
-    for col_idx, header in enumerate(HEADERS, 1):
-        cell = ws.cell(row=1, column=col_idx, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    col_widths = [8, 15, 15, 20, 20, 14, 12, 12, 50, 25, 12, 12]
-    for i, width in enumerate(col_widths, 1):
-        col_letter = chr(64 + i) if i <= 26 else chr(64 + (i - 1) // 26) + chr(64 + (i - 1) % 26 + 1)
-        ws.column_dimensions[col_letter].width = width
+async def save_to_csv_async(data: dict) -> bool:
+    """Append to the CSV store on the file thread so the event loop keeps running."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXCEL_EXECUTOR, save_to_csv, data)
 
-    ws.freeze_panes = "A2"
-    ws.auto_filter.ref = f"A1:L1"
+
+def save_leave_to_csv(emp_id, emp_name, dept, leave_date, reason, approved_by, leave_count):
+    """Append an approved leave to the leave register CSV.
+    If leave_count > 3, adds -₹500 salary deduction per extra leave.
+    """
+    try:
+        # Calculate deduction (₹500 for each leave starting from the 4th)
+        is_extra = int(leave_count) > 3
+        deduction_amt = (int(leave_count) - 3) * 500 if is_extra else 0
+        deduction = f"-₹{deduction_amt}" if is_extra else "—"
+        status = "⚠️ Extra Leave" if is_extra else "✅ Approved"
+
+        with _CSV_LOCK:
+            _migrate_legacy_excel()
+            path = config.LEAVES_CSV_FILE
+            sr = _next_sr_no(path, "Leave Register", lambda row: "Leave Register")
+            _append_csv(path, LEAVE_HEADERS, [
+                sr, emp_id, emp_name, dept, leave_date,
+                reason, approved_by, status, leave_count, deduction,
+            ])
+
+        logger.info(f"Excel: Leave #{leave_count} recorded for {emp_id} on {leave_date}" +
+                     (f" (Deduction: {deduction})" if is_extra else ""))
+        return is_extra
+    except Exception as e:
+        _CSV_COUNTERS.pop(config.LEAVES_CSV_FILE, None)
+        logger.error(f"Excel leave save failed: {e}", exc_info=True)
+        return False
 
 
-def _update_dashboard(wb):
-    """Create or update the Dashboard summary sheet."""
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+async def save_leave_to_csv_async(*args) -> bool:
+    """Append to the leave register on the file thread so the event loop keeps running."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXCEL_EXECUTOR, save_leave_to_csv, *args)
 
-    dash_name = "Dashboard"
-    if dash_name in wb.sheetnames:
-        ws = wb[dash_name]
-        ws.delete_rows(1, ws.max_row)
-    else:
-        ws = wb.create_sheet(dash_name)
 
-    # Dashboard headers
-    dash_headers = ["Employee ID", "Name", "Department", "Days Submitted", "Late Count", "On Leave", "Attendance %"]
-    header_fill = PatternFill(start_color="2E7D32", end_color="2E7D32", fill_type="solid")
-    header_font = Font(name="Arial", bold=True, color="FFFFFF", size=11)
+# ─── Excel Export (generated from the CSV store) ─────────────────────────────
+def _cell(ws, value, font=_DATA_FONT, fill=None, alignment=None, border=None):
+    """Build a styled cell for a write-only worksheet."""
+    cell = WriteOnlyCell(ws, value=value)
+    cell.font = font
+    if fill is not None:
+        cell.fill = fill
+    if alignment is not None:
+        cell.alignment = alignment
+    if border is not None:
+        cell.border = border
+    return cell
+
+
+def _as_number(value):
+    """CSV values are text; keep counters numeric in the workbook."""
+    return int(value) if value.isdigit() else value
 
-    for col_idx, header in enumerate(dash_headers, 1):
-        cell = ws.cell(row=1, column=col_idx, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center", vertical="center")
 
-    # Count submissions per employee across all monthly sheets
+def _write_header(ws, headers, widths, fill, border=None, alignment=_CENTER_ALIGN):
+    """Set column widths/frozen header and write the header row (write-only mode)."""
+    for i, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+    ws.freeze_panes = "A2"
+    ws.append([_cell(ws, h, _HEADER_FONT, fill, alignment, border) for h in headers])
+
+
+def _write_month_sheet(wb, month_name, rows):
+    """Write one monthly sheet with day separators and alternating row fills."""
+    ws = wb.create_sheet(month_name)
+    ws.auto_filter.ref = "A1:L1"
+    _write_header(ws, HEADERS, [8, 15, 15, 20, 20, 14, 12, 12, 50, 25, 12, 12],
+                  _HEADER_FILL, _HEADER_BORDER, _HEADER_ALIGN)
+
+    row_num = 1
+    last_date = None
+    for row in rows:
+        # New day → separator row
+        if last_date and last_date != row[1]:
+            row_num += 1
+            ws.merged_cells.add(f"A{row_num}:L{row_num}")
+            ws.append([_cell(ws, f"📅 {row[1]} — {row[2]}", _SEP_FONT, _SEP_FILL, _CENTER_ALIGN)])
+        last_date = row[1]
+
+        row_num += 1
+        sr_no = _as_number(row[0])
+        fill = _EVEN_ROW_FILL if isinstance(sr_no, int) and sr_no % 2 == 0 else _ODD_ROW_FILL
+        cells = []
+        for col, value in enumerate(row[:len(HEADERS)], 1):
+            font = _DATA_FONT
+            if col == 8:
+                font = _LATE_FONT if "LATE" in value else _ON_TIME_FONT
+            align = _CENTER_ALIGN if col in _CENTER_COLUMNS else _DATA_ALIGN
+            cells.append(_cell(ws, sr_no if col == 1 else value, font, fill, align, _DATA_BORDER))
+        ws.append(cells)
+
+
+def _write_dashboard(wb, updates, leaves):
+    """Write the Dashboard summary sheet."""
+    ws = wb.create_sheet("Dashboard")
+    dash_headers = ["Employee ID", "Name", "Department", "Days Submitted", "Late Count", "On Leave", "Attendance %"]
+    _write_header(ws, dash_headers, [15, 20, 15, 16, 12, 12, 14], _DASH_HEADER_FILL)
+
+    # Count submissions per employee across all months
     emp_stats = {}
-    for sheet_name in wb.sheetnames:
-        if sheet_name == dash_name:
-            continue
-        sheet = wb[sheet_name]
-        for row in range(2, sheet.max_row + 1):
-            emp_id = sheet.cell(row=row, column=5).value
-            if not emp_id:
-                continue
-            if emp_id not in emp_stats:
-                emp_stats[emp_id] = {"days": 0, "late": 0, "leave": 0}
-            emp_stats[emp_id]["days"] += 1
-            on_time_val = sheet.cell(row=row, column=8).value
-            if on_time_val and "Late" in str(on_time_val):
-                emp_stats[emp_id]["late"] += 1
-            status_val = sheet.cell(row=row, column=10).value # Source column
-            if status_val and "Leave" in str(status_val):
-                emp_stats[emp_id]["leave"] += 1
-
-    # Write rows
-    row_idx = 2
+    for row in updates:
+        stats = emp_stats.setdefault(row[4], {"days": 0, "late": 0, "leave": 0})
+        stats["days"] += 1
+        if "LATE" in row[7]:
+            stats["late"] += 1
+    for row in leaves:
+        emp_stats.setdefault(row[1], {"days": 0, "late": 0, "leave": 0})["leave"] += 1
+
     for emp_id, info in config.STAFF_RECORDS.items():
         stats = emp_stats.get(emp_id, {"days": 0, "late": 0, "leave": 0})
         # Simple 30-day attendance
         attendance = round((stats["days"] / 30) * 100, 1) if stats["days"] > 0 else 0
+        values = [emp_id, info["name"], info["dept"], stats["days"], stats["late"], stats["leave"], f"{attendance}%"]
+        ws.append([_cell(ws, v, alignment=_CENTER_ALIGN) for v in values])
 
-        ws.cell(row=row_idx, column=1, value=emp_id)
-        ws.cell(row=row_idx, column=2, value=info["name"])
-        ws.cell(row=row_idx, column=3, value=info["dept"])
-        ws.cell(row=row_idx, column=4, value=stats["days"])
-        ws.cell(row=row_idx, column=5, value=stats["late"])
-        ws.cell(row=row_idx, column=6, value=stats["leave"])
-        ws.cell(row=row_idx, column=7, value=f"{attendance}%")
-
-        for col in range(1, 8):
-            ws.cell(row=row_idx, column=col).alignment = Alignment(horizontal="center", vertical="center")
-            ws.cell(row=row_idx, column=col).font = Font(name="Arial", size=10)
 
-        row_idx += 1
+def _write_leave_register(wb, leaves):
+    """Write the Leave Register sheet, highlighting deductions."""
+    ws = wb.create_sheet("Leave Register")
+    _write_header(ws, LEAVE_HEADERS, [8, 15, 20, 15, 14, 40, 20, 14, 10, 16], _LEAVE_HEADER_FILL)
 
-    # Column widths
-    for i, w in enumerate([15, 20, 15, 16, 12, 12, 14], 1):
-        ws.column_dimensions[chr(64 + i)].width = w
+    for row in leaves:
+        is_extra = row[8].isdigit() and int(row[8]) > 3
+        cells = []
+        for col, value in enumerate(row[:len(LEAVE_HEADERS)], 1):
+            font, fill = _DATA_FONT, None
+            if is_extra and col == 10:
+                font, fill = _DEDUCTION_FONT, _DEDUCTION_FILL
+            elif is_extra and col == 8:
+                font = _LATE_FONT
+            cells.append(_cell(ws, _as_number(value) if col in (1, 9) else value, font, fill, _CENTER_ALIGN))
+        ws.append(cells)
 
-    ws.freeze_panes = "A2"
-
-
-def count_monthly_leaves(emp_id, leave_date_str):
-    """Count how many approved leaves an employee has in the same month."""
-    try:
-        leave_date = datetime.strptime(leave_date_str, "%d-%m-%Y")
-        month_key = leave_date.strftime("%Y-%m")
-        leave_log = config.load_leave_log()
-        count = 0
-        for date_str, entries in leave_log.items():
-            if date_str.startswith(month_key) and emp_id in entries:
-                count += 1
-        return count
-    except Exception:
-        return 0
 
+def build_excel_export(file_path=None) -> bool:
+    """Generate the styled .xlsx (monthly sheets, Dashboard, Leave Register) from the CSV store.
 
-def save_leave_to_excel(emp_id, emp_name, dept, leave_date, reason, approved_by, leave_count):
-    """Save an approved leave entry to the Leave Register sheet in Excel.
-    If leave_count > 3, adds -₹500 salary deduction per extra leave.
+    Returns False if the export failed or there is no data yet.
     """
+    file_path = file_path or config.EXCEL_FILE
     try:
-        from openpyxl import Workbook, load_workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
+        with _CSV_LOCK:
+            _migrate_legacy_excel()
+            updates = _read_csv(config.UPDATES_CSV_FILE)
+            leaves = _read_csv(config.LEAVES_CSV_FILE)
+        if not updates and not leaves:
+            # Nothing recorded yet: let /export answer "no data" instead of sending an empty workbook
+            logger.info("Excel: Nothing to export yet")
+            return False
 
-        file_path = config.EXCEL_FILE
+        months = {}
+        for row in updates:
+            if len(row) >= len(HEADERS):
+                months.setdefault(_month_of(row[1]), []).append(row)
+
+        wb = Workbook(write_only=True)
+        # Newest month first
+        for month_name in sorted(months, key=lambda m: datetime.strptime(m, "%b %Y"), reverse=True):
+            _write_month_sheet(wb, month_name, months[month_name])
+        _write_dashboard(wb, updates, leaves)
+        _write_leave_register(wb, [r for r in leaves if len(r) >= len(LEAVE_HEADERS)])
+
+        tmp_path = f"{file_path}.tmp"
+        wb.save(tmp_path)
+        os.replace(tmp_path, file_path)
+        logger.info(f"Excel: Exported {len(updates)} update(s) and {len(leaves)} leave(s) to {file_path}")
+        return True
 
-        if os.path.exists(file_path):
-            wb = load_workbook(file_path)
-        else:
-            wb = Workbook()
-            if "Sheet" in wb.sheetnames:
-                del wb["Sheet"]
+    except Exception as e:
+        logger.error(f"Excel export failed: {e}", exc_info=True)
+        return False
 
-        sheet_name = "Leave Register"
-        if sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            next_row = ws.max_row + 1
-
-            # Auto-upgrade old sheets: add missing columns if they don't exist
-            if ws.cell(row=1, column=9).value != "Leave #":
-                header_fill = PatternFill(start_color="E65100", end_color="E65100", fill_type="solid")
-                header_font = Font(name="Arial", bold=True, color="FFFFFF", size=11)
-                for col_idx, h in [(9, "Leave #"), (10, "Deduction")]:
-                    cell = ws.cell(row=1, column=col_idx, value=h)
-                    cell.fill = header_fill
-                    cell.font = header_font
-                    cell.alignment = Alignment(horizontal="center", vertical="center")
-                ws.column_dimensions["I"].width = 10
-                ws.column_dimensions["J"].width = 16
-        else:
-            ws = wb.create_sheet(sheet_name)
-            leave_headers = [
-                "Sr No", "Employee ID", "Name", "Department",
-                "Leave Date", "Reason", "Approved By", "Status",
-                "Leave #", "Deduction",
-            ]
-            header_fill = PatternFill(start_color="E65100", end_color="E65100", fill_type="solid")
-            header_font = Font(name="Arial", bold=True, color="FFFFFF", size=11)
-
-            for col_idx, h in enumerate(leave_headers, 1):
-                cell = ws.cell(row=1, column=col_idx, value=h)
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-
-            for i, w in enumerate([8, 15, 20, 15, 14, 40, 20, 14, 10, 16], 1):
-                ws.column_dimensions[chr(64 + i)].width = w
-
-            ws.freeze_panes = "A2"
-            next_row = 2
 
-        # Calculate deduction (₹500 for each leave starting from the 4th)
-        is_extra = int(leave_count) > 3
-        deduction_amt = (int(leave_count) - 3) * 500 if is_extra else 0
-        deduction = f"-₹{deduction_amt}" if is_extra else "—"
-        status = "⚠️ Extra Leave" if is_extra else "✅ Approved"
+async def build_excel_export_async(file_path=None) -> bool:
+    """Generate the .xlsx export without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXCEL_EXECUTOR, build_excel_export, file_path)
 
-        sr = next_row - 1
-        row_data = [
-            sr, emp_id, emp_name, dept, leave_date,
-            reason, approved_by, status, leave_count, deduction,
-        ]
 
-        for col_idx, val in enumerate(row_data, 1):
-            cell = ws.cell(row=next_row, column=col_idx, value=val)
-            cell.font = Font(name="Arial", size=10)
-            cell.alignment = Alignment(horizontal="center", vertical="center")
+# ─── Google Sheets Functions ─────────────────────────────────────────────────
+SHEETS_BATCH_SIZE = 50     # max rows per append_rows call
+SHEETS_MAX_WAIT = 2.0      # seconds to wait for more rows before flushing
+SHEETS_QUEUE_SIZE = 500    # bound on rows waiting to be written
+SHEETS_MIN_INTERVAL = 1.0  # seconds between batch writes (Sheets quota is 60 writes/min/user)
+SHEETS_MAX_RETRIES = 3     # attempts after the first before a failed row is dropped
+SHEETS_RETRY_DELAY = 10.0  # seconds before re-sending rows from a failed batch
+
+_sheets_queue = None       # asyncio.Queue, created by start_sheets_flusher()
+_sheets_task = None
+
+# sheet title -> {"rows": rows in sheet, "sr": last S.No., "last_date": str}
+_SHEET_COUNTERS = {}
+
+SHEETS_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
 
-        # Highlight deduction in red if applicable
-        if is_extra:
-            deduction_cell = ws.cell(row=next_row, column=10)
-            deduction_cell.font = Font(name="Arial", size=10, bold=True, color="DC143C")
-            deduction_cell.fill = PatternFill(start_color="FFE0E0", end_color="FFE0E0", fill_type="solid")
+# sheet title -> gspread Worksheet handle
+_WORKSHEETS = {}
 
-            status_cell = ws.cell(row=next_row, column=8)
-            status_cell.font = Font(name="Arial", size=10, color="DC143C")
+# Monthly sheets whose header row has already been verified this process
+_HEADERS_CHECKED = set()
 
-        wb.save(file_path)
-        logger.info(f"Excel: Leave #{leave_count} recorded for {emp_id} on {leave_date}" +
-                     (f" (Deduction: {deduction})" if is_extra else ""))
-        return is_extra
-    except Exception as e:
-        logger.error(f"Excel leave save failed: {e}", exc_info=True)
-        return False
 
+@functools.lru_cache(maxsize=1)
+def _get_spreadsheet():
+    """Authorize once and return the shared Spreadsheet handle.
 
-# ─── Google Sheets Functions ─────────────────────────────────────────────────
-def _save_to_google_sheets_sync(data: dict) -> bool:
-    """Synchronous Google Sheets save (runs in a thread)."""
-    if not config.GOOGLE_SHEET_ID:
+    google-auth refreshes the access token on the cached session as needed.
+    """
+    if gspread is None:
+        raise RuntimeError("gspread is not installed; Google Sheets sync is unavailable")
+    creds = Credentials.from_service_account_file(config.GOOGLE_CREDS_FILE, scopes=SHEETS_SCOPES)
+    client = gspread.authorize(creds)
+    return client.open_by_key(config.GOOGLE_SHEET_ID)
+
+
+async def _run_sheets(func, *args):
+    """Run a blocking Sheets call on the Sheets thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_SHEETS_EXECUTOR, func, *args)
+
+
+def _get_worksheet(title):
+    """Return a cached worksheet handle (raises WorksheetNotFound if missing)."""
+    sheet = _WORKSHEETS.get(title)
+    if sheet is None:
+        sheet = _WORKSHEETS[title] = _get_spreadsheet().worksheet(title)
+    return sheet
+
+
+def _get_sheet_counter(sheet):
+    """Return the in-memory row counter for a sheet, seeding it with one read of A:B."""
+    counter = _SHEET_COUNTERS.get(sheet.title)
+    if counter is None:
+        values = sheet.get("A:B")
+        counter = {"rows": len(values), "sr": 0, "last_date": ""}
+        for row in reversed(values[1:]):
+            if not counter["sr"] and row and str(row[0]).strip().isdigit():
+                counter["sr"] = int(row[0])
+            if not counter["last_date"] and len(row) > 1 and row[1]:
+                counter["last_date"] = row[1]
+            if counter["sr"] and counter["last_date"]:
+                break
+        _SHEET_COUNTERS[sheet.title] = counter
+    return counter
+
+
+def _append_rows_to_google_sheets_sync(batch: list) -> bool:
+    """Append a batch of updates to the monthly sheet in one API call (runs in a thread)."""
+    if not config.GOOGLE_SHEET_ID or not batch:
         return False
 
-    try:
-        import gspread
-        from google.oauth2.service_account import Credentials
-
-        scopes = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ]
+    month_name = _get_month_sheet_name()
 
-        creds = Credentials.from_service_account_file(config.GOOGLE_CREDS_FILE, scopes=scopes)
-        client = gspread.authorize(creds)
-        spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID)
-
-        month_name = _get_month_sheet_name()
-        on_time = _is_on_time(data)
+    try:
+        spreadsheet = _get_spreadsheet()
 
         # Get or create monthly worksheet
         try:
-            sheet = spreadsheet.worksheet(month_name)
+            sheet = _get_worksheet(month_name)
             # REPAIR HEADERS if they differ (e.g. from Check-in Time to Submit Time)
-            first_row = sheet.row_values(1)
-            if first_row[:len(HEADERS)] != HEADERS:
-                logger.info(f"Repairing headers in sheet '{month_name}'")
-                sheet.update("A1", [HEADERS]) # Use sheet.update for the whole range
+            if month_name not in _HEADERS_CHECKED:
+                first_row = sheet.row_values(1)
+                if first_row[:len(HEADERS)] != HEADERS:
+                    logger.info(f"Repairing headers in sheet '{month_name}'")
+                    sheet.update("A1", [HEADERS]) # Use sheet.update for the whole range
+                _HEADERS_CHECKED.add(month_name)
         except gspread.exceptions.WorksheetNotFound:
-            sheet = spreadsheet.add_worksheet(title=month_name, rows=1000, cols=12)
+            sheet = _WORKSHEETS[month_name] = spreadsheet.add_worksheet(title=month_name, rows=1000, cols=12)
             sheet.append_row(HEADERS)
             # Format header
             sheet.format("A1:L1", {
@@ -390,81 +503,83 @@ def _save_to_google_sheets_sync(data: dict) -> bool:
                 "horizontalAlignment": "CENTER",
             })
             sheet.freeze(rows=1)
+            _HEADERS_CHECKED.add(month_name)
+            _SHEET_COUNTERS[month_name] = {"rows": 1, "sr": 0, "last_date": ""}
 
-        existing = sheet.get_all_values()
-        
-        # Calculate sr_no robustly - find the last numeric Sr No
-        sr_no = 1
-        if len(existing) > 1:
-            for i in range(len(existing) - 1, 0, -1):
-                last_sr = existing[i][0]
-                if str(last_sr).strip().isdigit():
-                    sr_no = int(last_sr) + 1
-                    break
+        counter = _get_sheet_counter(sheet)
+        sr_no = counter["sr"]
+        last_date = counter["last_date"]
 
         new_rows = []
-        # Check if new day → insert separator row
-        if len(existing) > 1:
-            last_date = ""
-            # Look for the last non-empty date in column B (index 1)
-            for i in range(len(existing) - 1, 0, -1):
-                if len(existing[i]) > 1 and existing[i][1]:
-                    last_date = existing[i][1]
-                    break
-            
+        separator_rows = []  # 1-indexed sheet rows that hold a day separator
+        for data in batch:
+            # Check if new day → insert separator row
             if last_date and last_date != data["date"]:
                 separator = [""] * 12
                 separator[1] = f"─── {data['date']} ───"
                 new_rows.append(separator)
-
-        # Prepare main data row
-        is_revision = data.get("is_resubmission", False)
-        row = [
-            sr_no,                          # 1. S.No.
-            data["date"],                   # 2. Date
-            data["day"],                    # 3. Day
-            data["emp_name"],               # 4. Employee Name
-            data["emp_id"],                 # 5. Emp ID
-            data["department"],             # 6. Department
-            data["time"],                   # 7. Submit Time
-            "✅ ON TIME" if (data.get("on_time") == "Yes") else "❌ LATE", # 8. Punctuality
-            data["work_update"],            # 9. Work Report
-            data["group_name"],             # 10. Source
-            data["username"],               # 11. Telegram User
-            "📝 Edited" if is_revision else "Original" # 12. Revision
-        ]
-        new_rows.append(row)
+                separator_rows.append(counter["rows"] + len(new_rows))
+            last_date = data["date"]
+
+            # Prepare main data row
+            sr_no += 1
+            is_revision = data.get("is_resubmission", False)
+            new_rows.append([
+                sr_no,                          # 1. S.No.
+                data["date"],                   # 2. Date
+                data["day"],                    # 3. Day
+                data["emp_name"],               # 4. Employee Name
+                data["emp_id"],                 # 5. Emp ID
+                data["department"],             # 6. Department
+                data["time"],                   # 7. Submit Time
+                "✅ ON TIME" if (data.get("on_time") == "Yes") else "❌ LATE", # 8. Punctuality
+                data["work_update"],            # 9. Work Report
+                data["group_name"],             # 10. Source
+                data["username"],               # 11. Telegram User
+                "📝 Edited" if is_revision else "Original" # 12. Revision
+            ])
 
         # ATOMIC APPEND to prevent race conditions splitting separator and data
-        sheet.append_rows(new_rows, value_input_option="USER_ENTERED")
-        
-        # If we added a separator, format it
-        if len(new_rows) > 1:
+        sheet.append_rows(new_rows, value_input_option="RAW")
+        counter["rows"] += len(new_rows)
+        counter["sr"] = sr_no
+        counter["last_date"] = last_date
+
+        # If we added separators, format them in one request
+        if separator_rows:
             try:
-                last_idx = len(existing) + 1
-                sheet.format(f"A{last_idx}:L{last_idx}", {
-                    "backgroundColor": {"red": 0.95, "green": 0.95, "blue": 0.95},
-                    "textFormat": {"bold": True, "italic": True, "foregroundColor": {"red": 0.2, "green": 0.2, "blue": 0.2}},
-                    "horizontalAlignment": "CENTER",
-                })
+                sheet.batch_format([{
+                    "range": f"A{idx}:L{idx}",
+                    "format": {
+                        "backgroundColor": {"red": 0.95, "green": 0.95, "blue": 0.95},
+                        "textFormat": {"bold": True, "italic": True, "foregroundColor": {"red": 0.2, "green": 0.2, "blue": 0.2}},
+                        "horizontalAlignment": "CENTER",
+                    },
+                } for idx in separator_rows])
             except Exception as fmt_e:
                 logger.warning(f"Separator formatting failed: {fmt_e}")
 
-        logger.info(f"Google Sheets: Saved update #{sr_no} to {month_name}")
+        logger.info(f"Google Sheets: Saved {len(batch)} update(s) up to #{sr_no} to {month_name}")
 
         # Also update Attendance_Log if it exists (backward compatibility)
         try:
-            att_sheet = spreadsheet.worksheet("Attendance_Log")
-            att_existing = att_sheet.get_all_values()
-            att_sr = len(att_existing) if att_existing else 1
-            att_row = [
-                att_sr, data["emp_id"], data["department"], data["emp_name"],
-                data["date"], data["day"], data["time"],
-                "Present" if on_time else "Late",
-                data["work_update"], data["group_name"],
-            ]
-            att_sheet.append_row(att_row)
-            logger.info(f"Google Sheets: Also updated Attendance_Log #{att_sr}")
+            att_sheet = _get_worksheet("Attendance_Log")
+            att_counter = _SHEET_COUNTERS.get("Attendance_Log")
+            if att_counter is None:
+                att_counter = _SHEET_COUNTERS["Attendance_Log"] = {
+                    "rows": len(att_sheet.col_values(1)), "sr": 0, "last_date": "",
+                }
+            att_rows = []
+            for data in batch:
+                att_rows.append([
+                    max(att_counter["rows"] + len(att_rows), 1), data["emp_id"], data["department"],
+                    data["emp_name"], data["date"], data["day"], data["time"],
+                    "Present" if _is_on_time(data) else "Late",
+                    data["work_update"], data["group_name"],
+                ])
+            att_sheet.append_rows(att_rows)
+            att_counter["rows"] += len(att_rows)
+            logger.info(f"Google Sheets: Also updated Attendance_Log with {len(att_rows)} row(s)")
         except Exception:
             pass  # Attendance_Log doesn't exist or different format — skip
 
@@ -477,20 +592,28 @@ def _save_to_google_sheets_sync(data: dict) -> bool:
         return True
 
     except Exception as e:
+        # Counters may no longer match the sheet — re-read them on the next batch
+        _SHEET_COUNTERS.pop(month_name, None)
+        _SHEET_COUNTERS.pop("Attendance_Log", None)
+        _WORKSHEETS.pop(month_name, None)
+        _HEADERS_CHECKED.discard(month_name)
         logger.error(f"Google Sheets save failed: {e}", exc_info=True)
         return False
 
 
+def _save_to_google_sheets_sync(data: dict) -> bool:
+    """Synchronous Google Sheets save of a single update (runs in a thread)."""
+    return _append_rows_to_google_sheets_sync([data])
+
+
 def _update_google_sheets_summaries(spreadsheet, month_name):
     """Update Daily Summary, Department Summary, and Employee Monthly Report sheets."""
-    import pytz
-    tz = pytz.timezone(config.TIMEZONE)
-    now = datetime.now(tz)
+    now = datetime.now(config.TZ)
     today_str = now.strftime("%d-%m-%Y")
 
     # Read all data from the monthly sheet
     try:
-        sheet = spreadsheet.worksheet(month_name)
+        sheet = _get_worksheet(month_name)
         all_rows = sheet.get_all_values()
     except Exception:
         return
@@ -517,9 +640,7 @@ def _update_google_sheets_summaries(spreadsheet, month_name):
             continue
 
         # Daily data
-        if date not in daily_data:
-            daily_data[date] = {}
-        daily_data[date][emp_id] = {"time": time_str, "work": work, "on_time": on_time_val}
+        daily_data.setdefault(date, {})[emp_id] = {"time": time_str, "work": work, "on_time": on_time_val}
 
         # Monthly per-employee
         if emp_id not in emp_monthly:
@@ -532,10 +653,10 @@ def _update_google_sheets_summaries(spreadsheet, month_name):
     try:
         ds_name = "Daily Summary"
         try:
-            ds_sheet = spreadsheet.worksheet(ds_name)
+            ds_sheet = _get_worksheet(ds_name)
             ds_sheet.clear()
         except Exception:
-            ds_sheet = spreadsheet.add_worksheet(title=ds_name, rows=100, cols=7)
+            ds_sheet = _WORKSHEETS[ds_name] = spreadsheet.add_worksheet(title=ds_name, rows=100, cols=7)
 
         ds_headers = ["Date", "Total Staff", "Submitted", "Absent", "Attendance %", "Submitted IDs", "Absent IDs"]
         ds_rows = [ds_headers]
@@ -574,10 +695,10 @@ def _update_google_sheets_summaries(spreadsheet, month_name):
     try:
         dept_name = "Department Summary"
         try:
-            dept_sheet = spreadsheet.worksheet(dept_name)
+            dept_sheet = _get_worksheet(dept_name)
             dept_sheet.clear()
         except Exception:
-            dept_sheet = spreadsheet.add_worksheet(title=dept_name, rows=50, cols=6)
+            dept_sheet = _WORKSHEETS[dept_name] = spreadsheet.add_worksheet(title=dept_name, rows=50, cols=6)
 
         dept_headers = ["Department", "Total Staff", "Total Submissions", "Avg Submissions/Employee", "Employees", "Month"]
         dept_rows = [dept_headers]
@@ -615,10 +736,10 @@ def _update_google_sheets_summaries(spreadsheet, month_name):
     try:
         emp_name = "Employee Monthly Report"
         try:
-            emp_sheet = spreadsheet.worksheet(emp_name)
+            emp_sheet = _get_worksheet(emp_name)
             emp_sheet.clear()
         except Exception:
-            emp_sheet = spreadsheet.add_worksheet(title=emp_name, rows=100, cols=7)
+            emp_sheet = _WORKSHEETS[emp_name] = spreadsheet.add_worksheet(title=emp_name, rows=100, cols=7)
 
         # Count leaves from leave log
         leave_log = config.load_leave_log()
@@ -662,79 +783,197 @@ def _update_google_sheets_summaries(spreadsheet, month_name):
         logger.warning(f"Employee Monthly Report update failed: {e}")
 
 
+async def _sheets_flusher():
+    """Drain the write queue, writing up to SHEETS_BATCH_SIZE items per batch.
+
+    Items are ("append", data) or ("update", data); a None item stops the
+    writer after flushing the batch collected so far. Items from a failed
+    write are retried with the next batch (see _retry_items).
+    """
+    loop = asyncio.get_running_loop()
+    last_write = 0.0
+    retry = []
+    while True:
+        if retry:
+            batch, retry = retry, []
+        else:
+            item = await _sheets_queue.get()
+            if item is None:
+                return
+            batch = [item]
+        is_retry = len(batch[0]) > 2
+        stopping = False
+        deadline = loop.time() + SHEETS_MAX_WAIT
+        while len(batch) < SHEETS_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(_sheets_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+        # Pace writes to stay under the per-minute quota; rows keep queueing meanwhile.
+        # Back off longer when the previous write failed.
+        pause = last_write + (SHEETS_RETRY_DELAY if is_retry else SHEETS_MIN_INTERVAL) - loop.time()
+        if pause > 0 and not stopping:
+            await asyncio.sleep(pause)
+        retry = _retry_items(await _write_sheets_batch(batch))
+        last_write = loop.time()
+        if stopping:
+            # Give anything that just failed its remaining attempts before exiting
+            while retry:
+                await asyncio.sleep(SHEETS_RETRY_DELAY)
+                retry = _retry_items(await _write_sheets_batch(retry))
+            return
+
+
+def _retry_items(failed):
+    """Return failed queue items with their attempt count bumped, dropping (and logging) exhausted ones."""
+    retry = []
+    for kind, data, *attempts in failed:
+        attempt = (attempts[0] if attempts else 0) + 1
+        if attempt > SHEETS_MAX_RETRIES:
+            logger.error(
+                f"Google Sheets: giving up on {kind} for {data.get('emp_id')} on {data.get('date')} "
+                f"after {attempt} attempts — row is only in the CSV store"
+            )
+        else:
+            retry.append((kind, data, attempt))
+    return retry
+
+
+async def _write_sheets_batch(batch):
+    """Write one drained batch: new rows first, then in-place updates of earlier rows.
+
+    Appends and updates are written independently; returns the items whose write failed.
+    """
+    appends = [item for item in batch if item[0] == "append"]
+    updates = [item for item in batch if item[0] == "update"]
+    failed = []
+    async with SHEET_LOCK:
+        for items, write in ((appends, _append_rows_to_google_sheets_sync),
+                             (updates, _update_rows_in_google_sheets_sync)):
+            if not items:
+                continue
+            try:
+                ok = await _run_sheets(write, [item[1] for item in items])
+            except Exception as e:
+                logger.error(f"Google Sheets batch write failed: {e}", exc_info=True)
+                ok = False
+            if not ok:
+                logger.warning(f"Google Sheets: {len(items)} {items[0][0]}(s) failed, will retry")
+                failed += items
+    return failed
+
+
+def start_sheets_flusher():
+    """Start the background Sheets writer (call once the event loop is running)."""
+    global _sheets_queue, _sheets_task
+    if not config.GOOGLE_SHEET_ID or _sheets_task is not None:
+        return
+    _sheets_queue = asyncio.Queue(maxsize=SHEETS_QUEUE_SIZE)
+    _sheets_task = asyncio.create_task(_sheets_flusher())
+
+
+async def stop_sheets_flusher():
+    """Stop the background writer once everything queued has been written."""
+    global _sheets_task
+    if _sheets_task is None:
+        return
+    task, _sheets_task = _sheets_task, None
+    await _sheets_queue.put(None)
+    await task
+
+
 async def save_to_google_sheets(data: dict) -> bool:
-    """Save to Google Sheets in a background thread with locking."""
+    """Queue an update for the batched Sheets writer.
+
+    Returns True once the row is queued; the writer retries failed batches and
+    logs rows it has to give up on. Falls back to a direct write if the writer
+    isn't running.
+    """
+    if _sheets_task is not None:
+        await _sheets_queue.put(("append", data))
+        return True
+
     async with SHEET_LOCK:
         try:
-            return await asyncio.to_thread(_save_to_google_sheets_sync, data)
+            return await _run_sheets(_save_to_google_sheets_sync, data)
         except Exception as e:
             logger.error(f"Google Sheets async wrapper failed: {e}", exc_info=True)
             return False
 
 
-def _update_row_in_google_sheets_sync(data: dict) -> bool:
-    """Find and UPDATE an existing row by emp_id + date (for /allow re-submissions)."""
-    if not config.GOOGLE_SHEET_ID:
-        return False
+def _update_matching_rows(sheet, batch, id_col, date_col, values_of):
+    """Rewrite columns G:I of each row matching emp_id + date in one batch_update.
 
-    try:
-        import gspread
-        from google.oauth2.service_account import Credentials
+    id_col/date_col are 0-based positions within A:E. Returns the updates with no row.
+    """
+    rows = sheet.get("A:E")
+    index = {}
+    for row_num, row in enumerate(rows, 1):
+        if len(row) > max(id_col, date_col):
+            index.setdefault((row[id_col], row[date_col]), row_num)
+
+    updates, missing = [], []
+    for data in batch:
+        row_num = index.get((data["emp_id"], data["date"]))
+        if row_num is None:
+            missing.append(data)
+            continue
+        updates.append({"range": f"G{row_num}:I{row_num}", "values": [values_of(data)]})
 
-        scopes = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ]
+    if updates:
+        sheet.batch_update(updates, value_input_option="RAW")
+        logger.info(f"Google Sheets: Updated {len(updates)} row(s) in {sheet.title}")
+    return missing
 
-        creds = Credentials.from_service_account_file(config.GOOGLE_CREDS_FILE, scopes=scopes)
-        client = gspread.authorize(creds)
-        spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID)
 
-        month_name = _get_month_sheet_name()
-        on_time = _is_on_time(data)
-        emp_id = data["emp_id"]
-        target_date = data["date"]
+def _update_rows_in_google_sheets_sync(batch: list) -> bool:
+    """Find and UPDATE existing rows by emp_id + date (for /allow re-submissions).
 
-        updated = False
+    Each sheet is read once and written with a single request; updates whose
+    original row isn't found are appended instead.
+    """
+    if not config.GOOGLE_SHEET_ID or not batch:
+        return False
 
-        # Update in monthly sheet (Mar 2026)
+    try:
+        month_name = _get_month_sheet_name()
+        missing = list(batch)
+
+        # Update in monthly sheet (Mar 2026): Time (G), Punctuality (H), Work Update (I)
         try:
-            sheet = spreadsheet.worksheet(month_name)
-            all_rows = sheet.get_all_values()
-
-            for row_idx, row in enumerate(all_rows):
-                if len(row) >= 5 and row[4] == emp_id and row[1] == target_date:
-                    # Found the row — update Time (col 7), Punctuality (col 8), Work Update (col 9)
-                    actual_row = row_idx + 1  # 1-indexed
-                    sheet.update_cell(actual_row, 7, data["time"])
-                    sheet.update_cell(actual_row, 8, "✅ ON TIME" if on_time else "❌ LATE")
-                    sheet.update_cell(actual_row, 9, data["work_update"])
-                    logger.info(f"Google Sheets: Updated row {actual_row} in {month_name} for {emp_id}")
-                    updated = True
-                    break
+            sheet = _get_worksheet(month_name)
+            missing = _update_matching_rows(
+                sheet, batch, id_col=4, date_col=1,
+                values_of=lambda data: [
+                    data["time"], "✅ ON TIME" if _is_on_time(data) else "❌ LATE", data["work_update"],
+                ],
+            )
         except Exception as e:
             logger.warning(f"Failed to update {month_name}: {e}")
 
         # Also update Attendance_Log if it exists
         try:
-            att_sheet = spreadsheet.worksheet("Attendance_Log")
-            att_rows = att_sheet.get_all_values()
-
-            for row_idx, row in enumerate(att_rows):
-                if len(row) >= 5 and row[1] == emp_id and row[4] == target_date:
-                    actual_row = row_idx + 1
-                    att_sheet.update_cell(actual_row, 7, data["time"])
-                    att_sheet.update_cell(actual_row, 8, "Present" if on_time else "Late")
-                    att_sheet.update_cell(actual_row, 9, data["work_update"])
-                    logger.info(f"Google Sheets: Updated Attendance_Log row {actual_row} for {emp_id}")
-                    break
+            att_sheet = _get_worksheet("Attendance_Log")
+            _update_matching_rows(
+                att_sheet, batch, id_col=1, date_col=4,
+                values_of=lambda data: [
+                    data["time"], "Present" if _is_on_time(data) else "Late", data["work_update"],
+                ],
+            )
         except Exception:
             pass
 
         # If row not found, fall back to appending
-        if not updated:
-            logger.info(f"Row not found for {emp_id} on {target_date}, appending instead")
-            return _save_to_google_sheets_sync(data)
+        if missing:
+            logger.info(f"Rows not found for {', '.join(d['emp_id'] for d in missing)}, appending instead")
+            return _append_rows_to_google_sheets_sync(missing)
 
         return True
 
@@ -743,11 +982,23 @@ def _update_row_in_google_sheets_sync(data: dict) -> bool:
         return False
 
 
+def _update_row_in_google_sheets_sync(data: dict) -> bool:
+    """Find and UPDATE an existing row by emp_id + date (runs in a thread)."""
+    return _update_rows_in_google_sheets_sync([data])
+
+
 async def update_row_in_google_sheets(data: dict) -> bool:
-    """Update existing row in Google Sheets with locking."""
+    """Queue an in-place row update for the batched Sheets writer.
+
+    Falls back to a direct update (with locking) if the writer isn't running.
+    """
+    if _sheets_task is not None:
+        await _sheets_queue.put(("update", data))
+        return True
+
     async with SHEET_LOCK:
         try:
-            return await asyncio.to_thread(_update_row_in_google_sheets_sync, data)
+            return await _run_sheets(_update_row_in_google_sheets_sync, data)
         except Exception as e:
             logger.error(f"Google Sheets update async failed: {e}", exc_info=True)
             return False
@@ -759,31 +1010,15 @@ def _save_leave_to_google_sheets_sync(emp_id, emp_name, dept, leave_date, reason
         return False
 
     try:
-        import gspread
-        from google.oauth2.service_account import Credentials
-
-        scopes = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ]
-
-        creds = Credentials.from_service_account_file(config.GOOGLE_CREDS_FILE, scopes=scopes)
-        client = gspread.authorize(creds)
-        spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID)
+        spreadsheet = _get_spreadsheet()
 
         sheet_name = "Leave Register"
-        leave_headers = [
-            "Sr No", "Employee ID", "Name", "Department",
-            "Leave Date", "Reason", "Approved By", "Status",
-            "Leave #", "Deduction",
-        ]
-
         # Get or create Leave Register sheet
         try:
-            sheet = spreadsheet.worksheet(sheet_name)
+            sheet = _get_worksheet(sheet_name)
         except gspread.exceptions.WorksheetNotFound:
-            sheet = spreadsheet.add_worksheet(title=sheet_name, rows=500, cols=10)
-            sheet.append_row(leave_headers)
+            sheet = _WORKSHEETS[sheet_name] = spreadsheet.add_worksheet(title=sheet_name, rows=500, cols=10)
+            sheet.append_row(LEAVE_HEADERS)
             # Format header
             sheet.format("A1:J1", {
                 "backgroundColor": {"red": 0.902, "green": 0.318, "blue": 0.0},
@@ -841,7 +1076,7 @@ async def save_leave_to_google_sheets(emp_id, emp_name, dept, leave_date, reason
     """Save leave to Google Sheets in a background thread with locking."""
     async with SHEET_LOCK:
         try:
-            return await asyncio.to_thread(
+            return await _run_sheets(
                 _save_leave_to_google_sheets_sync,
                 emp_id, emp_name, dept, leave_date, reason, approved_by, leave_count
             )
@@ -861,18 +1096,6 @@ def _load_attendance_from_sheets_sync():
         return {}
 
     try:
-        import gspread
-        from google.oauth2.service_account import Credentials
-
-        scopes = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ]
-
-        creds = Credentials.from_service_account_file(config.GOOGLE_CREDS_FILE, scopes=scopes)
-        client = gspread.authorize(creds)
-        spreadsheet = client.open_by_key(config.GOOGLE_SHEET_ID)
-
         daily_log = {}
 
         # Read from the current month sheet
@@ -881,19 +1104,16 @@ def _load_attendance_from_sheets_sync():
 
         # Also try previous month (for recent history at start of month)
         try:
-            import pytz
-            tz = pytz.timezone(config.TIMEZONE)
-            now = datetime.now(tz)
+            now = datetime.now(config.TZ)
             if now.day <= 7:
-                from datetime import timedelta as td
-                prev_month = (now.replace(day=1) - td(days=1))
+                prev_month = (now.replace(day=1) - timedelta(days=1))
                 sheets_to_read.append(prev_month.strftime("%b %Y"))
         except Exception:
             pass
 
         for sheet_name in sheets_to_read:
             try:
-                sheet = spreadsheet.worksheet(sheet_name)
+                sheet = _get_worksheet(sheet_name)
                 rows = sheet.get_all_values()
 
                 if len(rows) < 2:
@@ -925,10 +1145,7 @@ def _load_attendance_from_sheets_sync():
                     except Exception:
                         continue
 
-                    if log_key not in daily_log:
-                        daily_log[log_key] = {}
-
-                    daily_log[log_key][emp_id] = {
+                    daily_log.setdefault(log_key, {})[emp_id] = {
                         "work": work,
                         "time": time_str,
                         "late": False,
@@ -949,7 +1166,7 @@ def _load_attendance_from_sheets_sync():
 async def load_attendance_from_google_sheets():
     """Load attendance from Google Sheets in a background thread (non-blocking)."""
     try:
-        return await asyncio.to_thread(_load_attendance_from_sheets_sync)
+        return await _run_sheets(_load_attendance_from_sheets_sync)
     except Exception as e:
         logger.error(f"Google Sheets read async failed: {e}", exc_info=True)
         return {}